@@ -0,0 +1,315 @@
+"""Broadcast a live game to spectators as a stream of small move deltas.
+
+The player's GUI sends each move to a relay over one TCP connection, and the
+relay fans it out to every spectator. The player's machine does the same
+work per move no matter how many people are watching.
+
+Relay (can run on any host):
+    python broadcast.py relay --port 9998
+Player (chess_game.py):
+    CHESS_BROADCAST=relay-host:9998 python chess_game.py
+Spectator (draws with chess_game.py's board functions):
+    python broadcast.py watch relay-host:9998
+
+A connection starts with one line, "PUB <channel>" or "SUB <channel>". After
+that come frames, each prefixed with a uint16 length, whose first byte gives
+the type:
+    K  keyframe  ply u32, clock ms u32, FEN of the position
+    M  move      ply u32, move u16, clock ms u32, eval i16 (white's cp, NO_EVAL if none)
+    R  result    UTF-8 text
+The relay keeps each channel's last keyframe and the frames since, so late
+joiners sync from that. The publisher sends a keyframe for every new game and
+every KEYFRAME_INTERVAL plies, which keeps that backlog short.
+"""
+import sys
+import time
+import queue
+import socket
+import struct
+import asyncio
+import argparse
+import threading
+
+import chess
+
+from opening_explorer import encode_move, decode_move
+
+DEFAULT_PORT = 9998
+DEFAULT_CHANNEL = "main"
+KEYFRAME_INTERVAL = 32  # Plies between keyframes
+MAX_VIEWER_BUFFER = 64 * 1024  # Spectators this far behind are dropped (they rejoin from a keyframe)
+RECONNECT_DELAY = 2.0
+NO_EVAL = -32768
+KEYFRAME_FORMAT = "<cII"
+MOVE_FORMAT = "<cIHIh"
+
+# === Frames ===
+def frame(payload):
+    return struct.pack("<H", len(payload)) + payload
+
+def keyframe_frame(ply, clock_ms, board):
+    return frame(struct.pack(KEYFRAME_FORMAT, b"K", ply, clock_ms) + board.fen().encode())
+
+def move_frame(ply, move, clock_ms, eval_cp=None):
+    eval_cp = NO_EVAL if eval_cp is None else max(-32767, min(32767, eval_cp))
+    return frame(struct.pack(MOVE_FORMAT, b"M", ply, encode_move(move), clock_ms, eval_cp))
+
+def result_frame(text):
+    return frame(b"R" + text.encode())
+
+def parse_frame(payload):
+    kind = payload[:1]
+    if kind == b"K":
+        _, ply, clock_ms = struct.unpack_from(KEYFRAME_FORMAT, payload)
+        return {"type": "keyframe", "ply": ply, "clock_ms": clock_ms,
+                "fen": payload[struct.calcsize(KEYFRAME_FORMAT):].decode()}
+    if kind == b"M":
+        _, ply, move, clock_ms, eval_cp = struct.unpack(MOVE_FORMAT, payload)
+        return {"type": "move", "ply": ply, "move": decode_move(move), "clock_ms": clock_ms,
+                "eval": None if eval_cp == NO_EVAL else eval_cp}
+    return {"type": "result", "text": payload[1:].decode()}
+
+# === Publisher (runs in the player's GUI) ===
+def broadcast_sender(broadcast):
+    """Send queued frames to the relay, reconnecting (and resyncing from the last keyframe) as needed"""
+    host, _, port = broadcast["address"].rpartition(":")
+    sock = None
+    keyframe, backlog = None, []
+    while True:
+        data = broadcast["queue"].get()
+        if data is None:
+            break
+        if data[2:3] == b"K":
+            keyframe, backlog = data, []
+        else:
+            backlog.append(data)
+        try:
+            if sock is None:
+                sock = socket.create_connection((host or "localhost", int(port or DEFAULT_PORT)), timeout=RECONNECT_DELAY)
+                sock.sendall(f"PUB {broadcast['channel']}\n".encode() + (keyframe or b"") + b"".join(backlog))
+            else:
+                sock.sendall(data)
+        except OSError:
+            if sock is not None:
+                sock.close()
+            sock = None  # Retried with the next frame; nothing is lost since the keyframe is resent
+    if sock is not None:
+        sock.close()
+
+def start_broadcast(address, channel=DEFAULT_CHANNEL):
+    broadcast = {
+        "address": address,
+        "channel": channel,
+        "queue": queue.Queue(),
+        "board": None,  # Board the last frames were for
+        "plies": 0,  # Moves of that board already published
+        "result": "",
+        "started": time.monotonic(),
+    }
+    broadcast["thread"] = threading.Thread(target=broadcast_sender, args=(broadcast,), daemon=True)
+    broadcast["thread"].start()
+    return broadcast
+
+def sync_broadcast(broadcast, board, game_result="", eval_cp=None):
+    """Publish whatever changed since the last call; eval_cp (white's cp) goes with the newest move"""
+    put = broadcast["queue"].put
+    plies = len(board.move_stack)
+    if broadcast["board"] is not board or plies < broadcast["plies"]:
+        # New game (or a take-back): start over from a keyframe
+        broadcast["board"] = board
+        broadcast["plies"] = plies
+        broadcast["result"] = ""
+        broadcast["started"] = time.monotonic()
+        put(keyframe_frame(plies, 0, board))
+
+    clock_ms = int((time.monotonic() - broadcast["started"]) * 1000)
+    for ply in range(broadcast["plies"], plies):
+        put(move_frame(ply, board.move_stack[ply], clock_ms, eval_cp if ply == plies - 1 else None))
+        if (ply + 1) % KEYFRAME_INTERVAL == 0 and ply + 1 == plies:
+            put(keyframe_frame(plies, clock_ms, board))
+    broadcast["plies"] = plies
+
+    if game_result and game_result != broadcast["result"]:
+        broadcast["result"] = game_result
+        put(result_frame(game_result))
+
+def stop_broadcast(broadcast):
+    broadcast["queue"].put(None)
+    broadcast["thread"].join(timeout=5)
+
+# === Relay ===
+async def relay_client(reader, writer, channels):
+    try:
+        role, _, channel = (await reader.readline()).decode().strip().partition(" ")
+    except (ConnectionError, UnicodeDecodeError):
+        writer.close()
+        return
+    state = channels.setdefault(channel or DEFAULT_CHANNEL, {"keyframe": None, "backlog": [], "viewers": set()})
+
+    try:
+        if role == "SUB":
+            if state["keyframe"]:
+                writer.write(state["keyframe"] + b"".join(state["backlog"]))
+            state["viewers"].add(writer)
+            await reader.read()  # Spectators only listen; returns when they disconnect
+        elif role == "PUB":
+            while True:
+                header = await reader.readexactly(2)
+                data = header + await reader.readexactly(struct.unpack("<H", header)[0])
+                if data[2:3] == b"K":
+                    state["keyframe"], state["backlog"] = data, []
+                else:
+                    state["backlog"].append(data)
+                for viewer in list(state["viewers"]):
+                    if viewer.transport.get_write_buffer_size() > MAX_VIEWER_BUFFER:
+                        state["viewers"].discard(viewer)
+                        viewer.close()
+                    else:
+                        viewer.write(data)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        state["viewers"].discard(writer)
+        writer.close()
+
+async def serve_relay(host, port):
+    channels = {}
+    server = await asyncio.start_server(lambda r, w: relay_client(r, w, channels), host, port)
+    print(f"Broadcast relay listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+# === Spectator ===
+def spectator_receiver(address, channel, event_type):
+    """Read frames from the relay and post each one as a pygame event"""
+    import pygame
+    host, _, port = address.rpartition(":")
+    while True:
+        try:
+            with socket.create_connection((host or "localhost", int(port or DEFAULT_PORT))) as sock:
+                sock.sendall(f"SUB {channel}\n".encode())
+                stream = sock.makefile("rb")
+                pygame.event.post(pygame.event.Event(event_type, frame=None, status="Connected"))
+                while True:
+                    header = stream.read(2)
+                    if len(header) < 2:
+                        break
+                    payload = stream.read(struct.unpack("<H", header)[0])
+                    pygame.event.post(pygame.event.Event(event_type, frame=parse_frame(payload), status=None))
+        except OSError:
+            pass
+        pygame.event.post(pygame.event.Event(event_type, frame=None, status="Reconnecting..."))
+        time.sleep(RECONNECT_DELAY)
+
+def watch(address, channel=DEFAULT_CHANNEL):
+    import pygame
+    import chess_game as cg
+
+    pygame.display.init()
+    pygame.font.init()
+    pygame.event.set_blocked(pygame.MOUSEMOTION)
+    width, height = cg.DEFAULT_BOARD_WIDTH + 200 + 2 * cg.MARGIN, cg.DEFAULT_BOARD_WIDTH + 2 * cg.MARGIN
+    screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
+    pygame.display.set_caption(f"Spectating {channel} - {address}")
+    cg.update_dimensions(width, height)
+    font = pygame.font.Font(None, 24)
+    font_small = pygame.font.Font(None, 20)
+    images = cg.load_images()
+
+    frame_event = pygame.event.custom_type()
+    threading.Thread(target=spectator_receiver, args=(address, channel, frame_event), daemon=True).start()
+
+    board = None  # Nothing to show until the first keyframe
+    base_ply = 0
+    move_history = cg.new_move_history()
+    history_ply = 0  # Game ply of the move history's first row
+    status, result, eval_cp, clock_ms = "Connecting...", "", None, 0
+    flipped = False
+    running = True
+    while running:
+        screen.fill(pygame.Color(50, 50, 50))
+        cg.draw_board(screen)
+        cg.draw_board_labels(screen, font, flipped)
+        if board is not None:
+            cg.draw_pieces(screen, board, images, flipped)
+
+        menu_start_x = cg.MARGIN + cg.BOARD_WIDTH + cg.MARGIN
+        pygame.draw.rect(screen, pygame.Color(240, 240, 240), pygame.Rect(menu_start_x, 0, cg.MENU_WIDTH, cg.TOTAL_HEIGHT))
+        lines = [f"Spectating: {channel}", status or f"Clock {clock_ms // 60000}:{clock_ms // 1000 % 60:02}"]
+        if eval_cp is not None:
+            lines.append(f"Eval {eval_cp / 100:+.2f}")
+        if result:
+            lines.append(result)
+        y_offset = 20
+        for line in lines:
+            screen.blit(font.render(line, True, pygame.Color(0, 0, 0)), (menu_start_x + 10, y_offset))
+            y_offset += 30
+        cg.draw_move_history(screen, font, font_small, move_history, y_offset + 10, menu_start_x)
+        pygame.display.flip()
+
+        for event in [pygame.event.wait()] + pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.VIDEORESIZE:
+                width, height = max(cg.MIN_WINDOW_WIDTH, event.w), max(cg.MIN_WINDOW_HEIGHT, event.h)
+                screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
+                cg.update_dimensions(width, height)
+                images = cg.load_images()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_f:
+                flipped = not flipped
+            elif event.type == pygame.MOUSEWHEEL:
+                cg.scroll_move_history(move_history, event.y)
+            elif event.type == frame_event:
+                if event.frame is None:
+                    status = event.status if event.status != "Connected" else None
+                    continue
+                data = event.frame
+                clock_ms = data.get("clock_ms", clock_ms)
+                if data["type"] == "keyframe":
+                    board = chess.Board(data["fen"])
+                    base_ply = data["ply"]
+                    kept = base_ply - history_ply
+                    if data["ply"] == 0 or data["clock_ms"] == 0:
+                        move_history = cg.new_move_history(board, track_termination=False)
+                        history_ply = base_ply
+                        result, eval_cp = "", None
+                    elif not move_history["san"] or not 0 <= kept <= len(move_history["san"]):
+                        # Joined mid-game, or missed moves: number the moves from here
+                        move_history = cg.new_move_history(board, track_termination=False)
+                        history_ply = base_ply
+                    else:
+                        # After a reconnect the relay resends its last keyframe and the moves since
+                        cg.truncate_move_history(move_history, kept)
+                elif data["type"] == "move":
+                    # Apply in order only; after a gap, wait for the next keyframe
+                    if board is not None and data["ply"] == base_ply + len(board.move_stack) and board.is_legal(data["move"]):
+                        cg.push_move(board, move_history, data["move"])
+                        if data["eval"] is not None:
+                            eval_cp = data["eval"]
+                else:
+                    result = data["text"]
+    pygame.quit()
+
+# === Command Line ===
+def main():
+    parser = argparse.ArgumentParser(description="Relay or watch a broadcast game")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    relay_parser = subparsers.add_parser("relay", help="fan games out to spectators")
+    relay_parser.add_argument("--host", default="0.0.0.0")
+    relay_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    watch_parser = subparsers.add_parser("watch", help="open a spectator window")
+    watch_parser.add_argument("address", nargs="?", default=f"localhost:{DEFAULT_PORT}")
+    watch_parser.add_argument("--channel", default=DEFAULT_CHANNEL)
+    args = parser.parse_args()
+
+    if args.mode == "relay":
+        try:
+            asyncio.run(serve_relay(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    watch(args.address, args.channel)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
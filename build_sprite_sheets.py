@@ -0,0 +1,59 @@
+"""Pack each piece set into a single sprite sheet with pre-scaled mip levels.
+
+Usage:
+    python build_sprite_sheets.py                 # all sets in PIECE_SETS
+    python build_sprite_sheets.py assets-custom   # specific folders
+
+Each folder gets pieces-sheet.rgba (raw pixels, one row of 12 pieces per
+square size) and pieces-sheet.json (sheet size plus the rect of every piece
+at every size). Raw pixels load with a single read and no PNG decode. load_images
+in chess_game.py uses the sheet when present and falls back to the loose
+PNGs otherwise, so re-run this after editing a set.
+"""
+import os
+import sys
+import json
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from chess_game import PIECE_FILES, PIECE_SETS, SPRITE_SHEET_FILE, SPRITE_INDEX_FILE
+
+# Square sizes the window commonly settles on (MIN_BOARD_WIDTH / 8 = 50,
+# DEFAULT_BOARD_WIDTH / 8 = 64) plus the 25px captured-pieces icons
+MIP_SIZES = [25, 50, 64, 72, 80, 96, 112, 128]
+
+def build_sprite_sheet(asset_folder, sizes=MIP_SIZES):
+    sources = {piece: pygame.image.load(os.path.join(asset_folder, filename))
+               for piece, filename in PIECE_FILES.items()}
+
+    sheet = pygame.Surface((len(PIECE_FILES) * max(sizes), sum(sizes)), pygame.SRCALPHA)
+    sheet.fill((0, 0, 0, 0))
+    levels = {}
+    y = 0
+    for size in sizes:
+        level = {}
+        for i, (piece, source) in enumerate(sources.items()):
+            x = i * size
+            sheet.blit(pygame.transform.smoothscale(source.convert_alpha(), (size, size)), (x, y))
+            level[piece] = [x, y, size, size]
+        levels[str(size)] = level
+        y += size
+
+    with open(os.path.join(asset_folder, SPRITE_SHEET_FILE), "wb") as f:
+        f.write(pygame.image.tobytes(sheet, "RGBA"))
+    with open(os.path.join(asset_folder, SPRITE_INDEX_FILE), "w") as f:
+        json.dump({"sheet_size": list(sheet.get_size()), "levels": levels}, f, indent=1)
+
+def main():
+    pygame.init()
+    pygame.display.set_mode((1, 1))  # convert_alpha needs a display
+    folders = sys.argv[1:] or list(PIECE_SETS.values())
+    for folder in folders:
+        build_sprite_sheet(folder)
+        print(f"Built sprite sheet for {folder}")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,23 @@ import pygame
 import chess
 import chess.engine
 import os
+import sys
+import bisect
+import json
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from game_core import (get_game_result_text, configure_engine_elo, parse_player_move, new_termination_tracker,
+                       track_push, track_pop, get_tracked_outcome, get_claimable_draw, get_cheap_play_profile,
+                       get_cheap_play_limit, pick_cheap_move, place_process)
+from move_review import (start_move_review, review_move, finish_move_review, reset_move_review,
+                         get_review_summary, stop_move_review, REVIEW_HASH_MB)
+from puzzle_db import open_puzzle_db, pick_puzzle, close_puzzle_db
+from opening_explorer import open_opening_db, lookup_moves, close_opening_db
+from broadcast import start_broadcast, sync_broadcast, stop_broadcast
+from memory_budget import (new_surface_cache, cache_get, cache_put, new_memory_budget, set_memory_tracing,
+                           sample_memory, get_memory_lines, SAMPLE_INTERVAL_MS)
 
 # === Settings ===
 MIN_BOARD_WIDTH = 400
@@ -11,6 +28,15 @@ FPS = 60
 MENU_WIDTH_RATIO = 0.35  # Menu width as ratio of total window width
 MIN_WINDOW_WIDTH = 700
 MIN_WINDOW_HEIGHT = 500
+RENDER_BACKEND = os.environ.get("CHESS_RENDERER", "software")  # "texture" draws the board through pygame._sdl2.video
+TEXTURE_PIECE_SIZE = 128  # Texture backend: sprites are uploaded once at this size and scaled by the renderer
+
+# === Event Loop ===
+# The main loop sleeps in pygame.event.wait; background work wakes it with these
+ENGINE_MOVE_EVENT = pygame.event.custom_type()  # An engine search finished
+LOADED_EVENT = pygame.event.custom_type()  # A background loader (engine, sounds) finished
+MEMORY_SAMPLE_EVENT = pygame.event.custom_type()  # Time for the memory budget's next sample
+REVIEW_POLL_MS = 250  # Wake-up interval while the post-game review is still running
 
 # Dynamic sizing variables (will be set in main)
 BOARD_WIDTH = DEFAULT_BOARD_WIDTH
@@ -22,6 +48,47 @@ TOTAL_HEIGHT = BOARD_WIDTH + 2 * MARGIN
 # === Update this with the path to your Stockfish binary ===
 STOCKFISH_PATH = "/Users/aditya/Documents/programming/chess/stockfish/stockfish-macos-m1-apple-silicon"
 
+# === Engine Recording / Replay (see engine_recorder.py) ===
+ENGINE_RECORD_FILE = os.environ.get("CHESS_ENGINE_RECORD")  # Log all UCI traffic to this file
+ENGINE_REPLAY_FILE = os.environ.get("CHESS_ENGINE_REPLAY")  # Play back a log instead of running Stockfish
+ENGINE_REPLAY_SPEED = float(os.environ.get("CHESS_ENGINE_REPLAY_SPEED", "1"))
+CHEAP_PLAY_SEED = 0  # Seeds the weak presets' random picks while recording or replaying, so a replay sends the same moves
+
+# === Shared Engine Server (see engine_server.py) ===
+ENGINE_SERVER = os.environ.get("CHESS_ENGINE_SERVER")  # "host:port" to use a shared engine instead of a local one
+ENGINE_RESTARTS = 3  # Failed searches in a row that restart (or reconnect) the engine before it is given up on
+
+# === Persistent Hash (Stockfish "Hash File" / "Save Hash" options) ===
+ENGINE_HASH_FILE = os.environ.get("CHESS_ENGINE_HASH_FILE", "engine.hash")  # Empty to start with a cleared hash; relative to the engine's cwd
+
+# === Engine Placement (keeps searches off the UI's core) ===
+ENGINE_CPUS = os.environ.get("CHESS_ENGINE_CPUS")  # e.g. "2-7" or "1,3,5"; default: every core but UI_CPU
+UI_CPU = int(os.environ.get("CHESS_UI_CPU", "0"))  # Core left to the pygame thread; -1 reserves none
+ENGINE_NICE = int(os.environ.get("CHESS_ENGINE_NICE", "5"))  # Priority increment for the engine (POSIX)
+ENGINE_THREADS = int(os.environ.get("CHESS_ENGINE_THREADS", "0"))  # 0 = the engine's default (Stockfish: 1)
+ENGINE_NUMA_POLICY = os.environ.get("CHESS_ENGINE_NUMA_POLICY")  # Stockfish NumaPolicy (numa.h); default "none" for a pinned engine
+
+# === Move Review (see move_review.py) ===
+MOVE_REVIEW_ENABLED = True  # Review the player's moves on a second, low-priority local engine
+
+# === Puzzle Mode (see puzzle_db.py) ===
+PUZZLE_DB_FILE = os.environ.get("CHESS_PUZZLE_DB", "puzzles.db")
+DEFAULT_PUZZLE_RATING = 1500
+
+# === Opening Explorer (see opening_explorer.py) ===
+OPENING_DB_FILE = os.environ.get("CHESS_OPENING_DB", "openings.db")
+EXPLORER_ROWS = 5  # Most played moves shown in the menu panel
+
+# === Spectator Broadcast (see broadcast.py) ===
+BROADCAST_RELAY = os.environ.get("CHESS_BROADCAST")  # "host:port" of a relay to stream this game to
+BROADCAST_CHANNEL = os.environ.get("CHESS_BROADCAST_CHANNEL", "main")
+
+# === Memory Budget (see memory_budget.py) ===
+MEMORY_BUDGET_MB = float(os.environ.get("CHESS_MEMORY_BUDGET_MB", "0"))  # Split between the GUI and the engines; 0 = no budget
+MEMORY_DEBUG = bool(os.environ.get("CHESS_MEMORY_DEBUG"))  # Start with the memory panel (F3) and tracemalloc on
+TEXT_CACHE_BYTES = 2 * 1024 * 1024  # Cache limits when there's no budget
+SPRITE_CACHE_BYTES = 4 * 1024 * 1024
+
 # === ELO Settings ===
 ELO_LEVELS = {
     "Beginner (800)": 800,
@@ -68,21 +135,61 @@ def load_sounds():
         # Return empty dict if sound files not found
         return {}
 
+# === Piece Image Files ===
+PIECE_FILES = {
+    'K': 'wK.png', 'Q': 'wQ.png', 'R': 'wR.png', 'B': 'wB.png', 'N': 'wN.png', 'P': 'wP.png',
+    'k': 'bK.png', 'q': 'bQ.png', 'r': 'bR.png', 'b': 'bB.png', 'n': 'bN.png', 'p': 'bP.png'
+}
+
+# === Sprite Sheets (built by build_sprite_sheets.py) ===
+SPRITE_SHEET_FILE = "pieces-sheet.rgba"  # Raw RGBA pixels, no decode step
+SPRITE_INDEX_FILE = "pieces-sheet.json"
+
+def load_sprite_sheet(asset_folder, size):
+    """Cut piece images out of a pre-baked sprite sheet, or return None if the set has none"""
+    index_path = os.path.join(asset_folder, SPRITE_INDEX_FILE)
+    sheet_path = os.path.join(asset_folder, SPRITE_SHEET_FILE)
+    if not (os.path.exists(index_path) and os.path.exists(sheet_path)):
+        return None
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        with open(sheet_path, "rb") as f:
+            sheet = pygame.image.frombuffer(f.read(), tuple(index["sheet_size"]), "RGBA")
+    except (OSError, ValueError, KeyError, pygame.error):
+        return None
+
+    levels = index["levels"]
+    # Use the exact mip level if baked, otherwise scale down from the nearest larger one
+    level = levels.get(str(size))
+    if level is None:
+        larger = [int(s) for s in levels if int(s) >= size]
+        level = levels[str(min(larger) if larger else max(int(s) for s in levels))]
+    images = {}
+    for piece, (x, y, w, h) in level.items():
+        image = sheet.subsurface(pygame.Rect(x, y, w, h))
+        if w != size:
+            image = pygame.transform.smoothscale(image, (size, size))
+        images[piece] = image
+    return images
+
 # === Load Images ===
-def load_images(asset_folder="assets-classic"):
-    mapping = {
-        'K': 'wK.png', 'Q': 'wQ.png', 'R': 'wR.png', 'B': 'wB.png', 'N': 'wN.png', 'P': 'wP.png',
-        'k': 'bK.png', 'q': 'bQ.png', 'r': 'bR.png', 'b': 'bB.png', 'n': 'bN.png', 'p': 'bP.png'
-    }
+def load_images(asset_folder="assets-classic", size=None):
+    size = size or SQUARE_SIZE
+    images = load_sprite_sheet(asset_folder, size)
+    if images is not None:
+        return images
+
+    # No sprite sheet (e.g. a custom set) - decode and scale the loose PNGs
     images = {}
-    for piece, filename in mapping.items():
+    for piece, filename in PIECE_FILES.items():
         try:
             images[piece] = pygame.transform.scale(
-                pygame.image.load(f"{asset_folder}/{filename}"), (SQUARE_SIZE, SQUARE_SIZE))
-        except pygame.error:
+                pygame.image.load(f"{asset_folder}/{filename}"), (size, size))
+        except (pygame.error, FileNotFoundError):
             # Fallback to assets-classic if piece not found in selected set
             images[piece] = pygame.transform.scale(
-                pygame.image.load(f"assets-classic/{filename}"), (SQUARE_SIZE, SQUARE_SIZE))
+                pygame.image.load(f"assets-classic/{filename}"), (size, size))
     return images
 
 # === Update Window Dimensions ===
@@ -99,6 +206,21 @@ def update_dimensions(window_width, window_height):
     TOTAL_WIDTH = window_width
     TOTAL_HEIGHT = window_height
 
+# === Cached Text and Sprites ===
+# Menu text and captured-piece thumbnails are the same from frame to frame, so
+# they're rendered once into byte-limited LRU caches instead of every frame
+_text_cache = new_surface_cache(TEXT_CACHE_BYTES)
+_sprite_cache = new_surface_cache(SPRITE_CACHE_BYTES)
+
+def render_text(font, text, color):
+    key = (id(font), text, tuple(color))
+    return cache_get(_text_cache, key) or cache_put(_text_cache, key, font.render(text, True, color))
+
+def get_scaled_piece(images, piece, size):
+    """Piece image scaled to size; keyed by the source surface so a new piece set misses"""
+    key = (images[piece], size)
+    return cache_get(_sprite_cache, key) or cache_put(_sprite_cache, key, pygame.transform.scale(images[piece], (size, size)))
+
 # === Draw Board Labels (Ranks and Files) ===
 def draw_board_labels(screen, font, flipped=False):
     if flipped:
@@ -114,11 +236,11 @@ def draw_board_labels(screen, font, flipped=False):
         x_center = MARGIN + i * SQUARE_SIZE + SQUARE_SIZE // 2
 
         # Top
-        text_top = font.render(file_label, True, label_color)
+        text_top = render_text(font, file_label, label_color)
         screen.blit(text_top, text_top.get_rect(center=(x_center, MARGIN // 2)))
 
         # Bottom
-        text_bottom = font.render(file_label, True, label_color)
+        text_bottom = render_text(font, file_label, label_color)
         screen.blit(text_bottom, text_bottom.get_rect(center=(x_center, MARGIN + BOARD_WIDTH + MARGIN // 2)))
 
     # Ranks: left and right
@@ -126,11 +248,11 @@ def draw_board_labels(screen, font, flipped=False):
         y_center = MARGIN + i * SQUARE_SIZE + SQUARE_SIZE // 2
 
         # Left
-        text_left = font.render(rank_label, True, label_color)
+        text_left = render_text(font, rank_label, label_color)
         screen.blit(text_left, text_left.get_rect(center=(MARGIN // 2, y_center)))
 
         # Right
-        text_right = font.render(rank_label, True, label_color)
+        text_right = render_text(font, rank_label, label_color)
         screen.blit(text_right, text_right.get_rect(center=(MARGIN + BOARD_WIDTH + MARGIN // 2, y_center)))
 
 # === Draw Legal Moves ===
@@ -213,6 +335,79 @@ def get_square_from_pos(pos, flipped=False):
         row = int(7 - (y // SQUARE_SIZE))
     return chess.square(col, row)
 
+# === Texture Renderer Backend ===
+def get_square_rect(square, flipped=False):
+    if flipped:
+        row = square // 8
+        col = 7 - (square % 8)
+    else:
+        row = 7 - square // 8
+        col = square % 8
+    return pygame.Rect(MARGIN + col*SQUARE_SIZE, MARGIN + row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+def open_texture_renderer(title, size):
+    """Window and renderer for the texture backend, falling back to SDL's software renderer without a GPU"""
+    from pygame._sdl2.video import Window, Renderer, Texture, error
+    window = Window(title, size=size, resizable=True)
+    try:
+        renderer = Renderer(window, accelerated=1)
+    except error:
+        renderer = Renderer(window, accelerated=0)
+
+    # Legal-move markers, drawn once the same way draw_legal_moves draws them
+    dot = pygame.Surface((16, 16), pygame.SRCALPHA)
+    pygame.draw.circle(dot, pygame.Color(100, 255, 100), (8, 8), 8)
+    ring = pygame.Surface((30, 30), pygame.SRCALPHA)
+    pygame.draw.circle(ring, pygame.Color(255, 100, 100), (15, 15), 15, 3)
+
+    return {
+        "window": window,
+        "renderer": renderer,
+        "pieces": {},  # Piece symbol -> texture at native resolution
+        "markers": {"move": Texture.from_surface(renderer, dot), "capture": Texture.from_surface(renderer, ring)},
+        "overlay": None,  # Texture holding the labels and menu panel
+    }
+
+def upload_piece_textures(textured, images):
+    """Upload a piece set once; the renderer scales it to whatever the square size is"""
+    from pygame._sdl2.video import Texture
+    textured["pieces"] = {piece: Texture.from_surface(textured["renderer"], image) for piece, image in images.items()}
+
+def present_textured_frame(textured, overlay, board, selected_square, flipped=False):
+    """Draw the board, highlights and pieces with the renderer, then the software-drawn overlay on top"""
+    from pygame._sdl2.video import Texture
+    renderer = textured["renderer"]
+    renderer.draw_color = pygame.Color(50, 50, 50)
+    renderer.clear()
+
+    colors = [pygame.Color(240, 217, 181), pygame.Color(181, 136, 99)]
+    for row in range(8):
+        for col in range(8):
+            renderer.draw_color = colors[(row + col) % 2]
+            renderer.fill_rect(pygame.Rect(MARGIN + col*SQUARE_SIZE, MARGIN + row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+    if selected_square is not None:
+        renderer.draw_color = pygame.Color(255, 255, 0)
+        rect = get_square_rect(selected_square, flipped)
+        for inset in range(4):  # 4px border, as in draw_selected_square
+            renderer.draw_rect(rect.inflate(-2 * inset, -2 * inset))
+        for move in board.legal_moves:
+            if move.from_square == selected_square:
+                marker = textured["markers"]["capture" if board.piece_at(move.to_square) else "move"]
+                marker.draw(dstrect=marker.get_rect(center=get_square_rect(move.to_square, flipped).center))
+
+    for square, piece in board.piece_map().items():
+        textured["pieces"][piece.symbol()].draw(dstrect=get_square_rect(square, flipped))
+
+    # Labels and menu panel come from the software draw functions as one texture
+    texture = textured["overlay"]
+    if texture is None or (texture.width, texture.height) != overlay.get_size():
+        texture = textured["overlay"] = Texture.from_surface(renderer, overlay)
+    else:
+        texture.update(overlay)
+    texture.draw()
+    renderer.present()
+
 # === Track and Draw Captured Pieces ===
 def get_captured_pieces(board):
     """Returns lists of captured pieces for both sides"""
@@ -247,13 +442,13 @@ def draw_captured_pieces(screen, font, font_small, images, board, y_start, menu_
     white_captured, black_captured = get_captured_pieces(board)
 
     # Title
-    title_text = font.render("Captured Pieces:", True, pygame.Color(0, 0, 0))
+    title_text = render_text(font, "Captured Pieces:", pygame.Color(0, 0, 0))
     screen.blit(title_text, (menu_start_x + 10, y_start))
     y_offset = y_start + 25
     
     # White pieces captured by black (you lost these)
     if white_captured:
-        label_text = font_small.render("You lost:", True, pygame.Color(150, 0, 0))
+        label_text = render_text(font_small, "You lost:", pygame.Color(150, 0, 0))
         screen.blit(label_text, (menu_start_x + 10, y_offset))
         y_offset += 20
 
@@ -265,7 +460,7 @@ def draw_captured_pieces(screen, font, font_small, images, board, y_start, menu_
                 x_offset = menu_start_x + 10
             
             # Scale down the piece image
-            small_image = pygame.transform.scale(images[piece], (piece_size, piece_size))
+            small_image = get_scaled_piece(images, piece, piece_size)
             screen.blit(small_image, (x_offset, y_offset))
             x_offset += piece_size + 2
         
@@ -273,7 +468,7 @@ def draw_captured_pieces(screen, font, font_small, images, board, y_start, menu_
     
     # Black pieces captured by white (you captured these)
     if black_captured:
-        label_text = font_small.render("You captured:", True, pygame.Color(0, 150, 0))
+        label_text = render_text(font_small, "You captured:", pygame.Color(0, 150, 0))
         screen.blit(label_text, (menu_start_x + 10, y_offset))
         y_offset += 20
 
@@ -285,7 +480,7 @@ def draw_captured_pieces(screen, font, font_small, images, board, y_start, menu_
                 x_offset = menu_start_x + 10
             
             # Scale down the piece image
-            small_image = pygame.transform.scale(images[piece], (piece_size, piece_size))
+            small_image = get_scaled_piece(images, piece, piece_size)
             screen.blit(small_image, (x_offset, y_offset))
             x_offset += piece_size + 2
         
@@ -293,128 +488,266 @@ def draw_captured_pieces(screen, font, font_small, images, board, y_start, menu_
     
     return y_offset  # Return new y position for next elements
 
+# === Move History (SAN) ===
+MOVE_HISTORY_ROWS = 10  # Rows shown in the menu panel
+MOVE_HISTORY_CACHE_SIZE = 64  # Rendered rows kept around for scrolling
+
+def new_move_history(board=None, track_termination=True):
+    """SAN list kept in step with board.move_stack, plus rendered row surfaces.
+
+    Given the board, moves are numbered from its starting position (puzzles
+    often start with black to move), and unless track_termination is off it
+    also tracks game termination (see game_core) so the main loop never has
+    to call board.is_game_over().
+    """
+    root = board.root() if board is not None else chess.Board()
+    return {"san": [], "surfaces": {}, "scroll": 0, "rect": None,
+            "first_ply": 0 if root.turn == chess.WHITE else 1,  # Plies since white's first move
+            "first_move_number": root.fullmove_number,
+            "termination": new_termination_tracker(board) if board is not None and track_termination else None}
+
+def push_move(board, move_history, move):
+    """Push a move, recording its SAN (which needs the position before the move)"""
+    move_history["san"].append(board.san(move))
+    board.push(move)
+    if move_history["termination"] is not None:
+        track_push(move_history["termination"], board)
+
+def pop_move(board, move_history):
+    """Take back the last move and drop its history row"""
+    move = board.pop()
+    if move_history["termination"] is not None:
+        track_pop(move_history["termination"], board)
+    ply = len(move_history["san"]) - 1
+    move_history["san"].pop()
+    move_history["surfaces"].pop(ply, None)
+    return move
+
+def truncate_move_history(move_history, length):
+    """Drop the rows from ply length on (for histories kept without a board, like the spectator's)"""
+    for ply in range(length, len(move_history["san"])):
+        move_history["surfaces"].pop(ply, None)
+    del move_history["san"][length:]
+    scroll_move_history(move_history, 0)
+
+def scroll_move_history(move_history, rows):
+    """Scroll back (positive) or forward (negative); 0 follows the latest move"""
+    max_scroll = max(0, len(move_history["san"]) - MOVE_HISTORY_ROWS)
+    move_history["scroll"] = max(0, min(max_scroll, move_history["scroll"] + rows))
+
+def get_move_row_surface(font_small, move_history, ply):
+    """Rendered text for one ply, cached so each row is only rendered once"""
+    surfaces = move_history["surfaces"]
+    surface = surfaces.get(ply)
+    if surface is None:
+        san = move_history["san"][ply]
+        game_ply = move_history["first_ply"] + ply
+        move_number = move_history["first_move_number"] + game_ply // 2
+        if game_ply % 2 == 0:  # White move
+            move_text = f"{move_number}. {san}"
+        elif ply == 0:  # The history starts with black to move
+            move_text = f"{move_number}... {san}"
+        else:  # Black move
+            move_text = f"   {san}"
+        surface = font_small.render(move_text, True, pygame.Color(0, 0, 0))
+        if len(surfaces) >= MOVE_HISTORY_CACHE_SIZE:
+            del surfaces[next(iter(surfaces))]  # Evict the oldest rendered row
+        surfaces[ply] = surface
+    return surface
+
 # === Draw Move History ===
-def draw_move_history(screen, font, font_small, board, y_start, menu_start_x):
-    """Draw the last 10 moves in the menu panel"""
-    title_text = font.render("Move History:", True, pygame.Color(0, 0, 0))
+def draw_move_history(screen, font, font_small, move_history, y_start, menu_start_x):
+    """Draw the visible window of the move history in the menu panel"""
+    total = len(move_history["san"])
+    title = "Move History:" if move_history["scroll"] == 0 else f"Move History (-{move_history['scroll']}):"
+    title_text = render_text(font, title, pygame.Color(0, 0, 0))
     screen.blit(title_text, (menu_start_x + 10, y_start))
     y_offset = y_start + 25
 
-    # Get last 10 moves
-    moves = list(board.move_stack)[-10:]
+    # Only the rows in view are looked up/rendered
+    end = total - move_history["scroll"]
+    start = max(0, end - MOVE_HISTORY_ROWS)
+    move_history["rect"] = pygame.Rect(menu_start_x, y_start, MENU_WIDTH, 25 + MOVE_HISTORY_ROWS * 20)
 
-    for i, move in enumerate(moves):
-        move_num = len(board.move_stack) - len(moves) + i + 1
-        if move_num % 2 == 1:  # White move
-            move_text = f"{(move_num + 1) // 2}. {move}"
-        else:  # Black move
-            move_text = f"   {move}"
-
-        text_surface = font_small.render(move_text, True, pygame.Color(0, 0, 0))
-        screen.blit(text_surface, (menu_start_x + 10, y_offset))
+    for ply in range(start, end):
+        screen.blit(get_move_row_surface(font_small, move_history, ply), (menu_start_x + 10, y_offset))
         y_offset += 20
 
     return y_offset + 10
 
-# === Draw Menu Panel ===
-def draw_menu_panel(screen, font, font_small, images, board, selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, game_over, game_result, game_started):
-    # Fill menu area with gray background
-    menu_start_x = MARGIN + BOARD_WIDTH + MARGIN
-    menu_rect = pygame.Rect(menu_start_x, 0, MENU_WIDTH, TOTAL_HEIGHT)
-    pygame.draw.rect(screen, pygame.Color(240, 240, 240), menu_rect)
-
-    y_offset = 20
-    section_spacing = max(15, TOTAL_HEIGHT // 40)
-    item_spacing = max(8, TOTAL_HEIGHT // 80)
-
-    # Player Color Selection (only if game not started)
-    if not game_started:
-        title_text = font.render("Play as:", True, pygame.Color(0, 0, 0))
-        screen.blit(title_text, (menu_start_x + 10, y_offset))
-        y_offset += 25
-
-        for label, color in PLAYER_COLORS.items():
-            text_color = pygame.Color(0, 100, 0) if color == player_color else pygame.Color(50, 50, 50)
-            color_text = font_small.render(label, True, text_color)
-            screen.blit(color_text, (menu_start_x + 10, y_offset))
-            y_offset += 20
-
-        y_offset += section_spacing
-    else:
-        # Show current player color when game is active
-        current_color = "White" if player_color == chess.WHITE else "Black"
-        title_text = font.render(f"Playing as: {current_color}", True, pygame.Color(0, 100, 0))
-        screen.blit(title_text, (menu_start_x + 10, y_offset))
-        y_offset += 30
-
-    # ELO Selection
-    title_text = font.render("Difficulty (ELO):", True, pygame.Color(0, 0, 0))
-    screen.blit(title_text, (menu_start_x + 10, y_offset))
-    y_offset += 25
+# === Opening Explorer ===
+def new_opening_explorer(path):
+    """Memory-mapped explorer index, or None if it hasn't been built"""
+    if not os.path.exists(path):
+        return None
+    return {"db": open_opening_db(path), "key": None, "rows": []}
+
+def get_explorer_rows(explorer, font_small, board):
+    """Rendered rows for the current position, looked up once per move"""
+    key = (id(board), len(board.move_stack), board.peek() if board.move_stack else None)
+    if explorer["key"] != key:
+        rows = []
+        for move, white, draws, black in lookup_moves(explorer["db"], board)[:EXPLORER_ROWS]:
+            total = white + draws + black
+            text = f"{board.san(move):6} {total:>7}  {100 * white // total}/{100 * draws // total}/{100 * black // total}%"
+            rows.append(font_small.render(text, True, pygame.Color(0, 0, 0)))
+        explorer["key"] = key
+        explorer["rows"] = rows
+    return explorer["rows"]
+
+def draw_opening_explorer(screen, font, font_small, explorer, board, y_start, menu_start_x):
+    """Most played moves from the current position with white/draw/black percentages"""
+    title_text = render_text(font, "Opening Explorer:", pygame.Color(0, 0, 0))
+    screen.blit(title_text, (menu_start_x + 10, y_start))
+    y_offset = y_start + 25
 
-    for i, (label, elo) in enumerate(ELO_LEVELS.items()):
-        color = pygame.Color(0, 100, 0) if elo == selected_elo else pygame.Color(50, 50, 50)
-        elo_text = font_small.render(label, True, color)
-        screen.blit(elo_text, (menu_start_x + 10, y_offset))
+    rows = get_explorer_rows(explorer, font_small, board)
+    if not rows:
+        rows = [render_text(font_small, "Out of book", pygame.Color(120, 120, 120))]
+    for row in rows:
+        screen.blit(row, (menu_start_x + 10, y_offset))
         y_offset += 20
 
-    y_offset += section_spacing
+    return y_offset + 10
 
-    # Thinking Time Selection
-    title_text = font.render("Game Speed:", True, pygame.Color(0, 0, 0))
-    screen.blit(title_text, (menu_start_x + 10, y_offset))
-    y_offset += 25
+# === Menu Layout ===
+MENU_SCROLL_STEP = 40  # Pixels the menu panel scrolls per mouse wheel tick
+_menu_layout_cache = {}
 
-    for label, time_val in THINKING_TIMES.items():
-        color = pygame.Color(0, 100, 0) if time_val == selected_thinking_time else pygame.Color(50, 50, 50)
-        time_text = font_small.render(label, True, color)
-        screen.blit(time_text, (menu_start_x + 10, y_offset))
-        y_offset += 20
+def get_menu_layout(game_started, game_over, can_claim=False):
+    """Build the menu's rect-to-action index, cached per window size and game state.
 
-    y_offset += section_spacing
+    Returns a dict with:
+      items - every (rect, kind, label, value) entry in draw order
+      hit_tops / hit_items - clickable entries sorted by rect.top for bisect lookup
+      bottom - y position where the non-interactive sections start
+    """
+    key = (TOTAL_WIDTH, TOTAL_HEIGHT, BOARD_WIDTH, MENU_WIDTH, game_started, game_over, can_claim)
+    layout = _menu_layout_cache.get(key)
+    if layout is not None:
+        return layout
 
-    # Piece Set Selection
-    title_text = font.render("Chess Piece:", True, pygame.Color(0, 0, 0))
-    screen.blit(title_text, (menu_start_x + 10, y_offset))
-    y_offset += 25
+    menu_start_x = MARGIN + BOARD_WIDTH + MARGIN
+    x = menu_start_x + 10
+    row_width = MENU_WIDTH - 20
+    section_spacing = max(15, TOTAL_HEIGHT // 40)
+    items = []
+    y_offset = 20
 
-    for label, folder in PIECE_SETS.items():
-        color = pygame.Color(0, 100, 0) if folder == selected_piece_set else pygame.Color(50, 50, 50)
-        piece_text = font_small.render(label, True, color)
-        screen.blit(piece_text, (menu_start_x + 10, y_offset))
-        y_offset += 20
+    def add_section(title, kind, options):
+        nonlocal y_offset
+        items.append((pygame.Rect(x, y_offset, row_width, 25), "title", title, None))
+        y_offset += 25
+        for label, value in options.items():
+            items.append((pygame.Rect(x, y_offset, row_width, 20), kind, label, value))
+            y_offset += 20
+        y_offset += section_spacing
 
-    y_offset += section_spacing
+    # Player Color Selection (only if game not started)
+    if not game_started:
+        add_section("Play as:", "player_color", PLAYER_COLORS)
+    else:
+        items.append((pygame.Rect(x, y_offset, row_width, 30), "playing_as", None, None))
+        y_offset += 30
 
-    # Board Flip Button
-    flip_text = "Flip Board" + (" ✓" if board_flipped else "")
-    button_width = MENU_WIDTH - 20
-    flip_rect = pygame.Rect(menu_start_x + 10, y_offset, button_width, 30)
-    pygame.draw.rect(screen, pygame.Color(150, 200, 255), flip_rect)
-    pygame.draw.rect(screen, pygame.Color(0, 0, 0), flip_rect, 2)
-    flip_button_text = font.render(flip_text, True, pygame.Color(0, 0, 0))
-    screen.blit(flip_button_text, (menu_start_x + 15, y_offset + 6))
+    add_section("Difficulty (ELO):", "elo", ELO_LEVELS)
+    add_section("Game Speed:", "thinking_time", THINKING_TIMES)
+    add_section("Chess Piece:", "piece_set", PIECE_SETS)
 
-    y_offset += 45
+    def add_buttons(*buttons):
+        """One row of buttons sharing the panel width"""
+        nonlocal y_offset
+        width = (row_width - 10 * (len(buttons) - 1)) // len(buttons)
+        for i, (kind, label) in enumerate(buttons):
+            items.append((pygame.Rect(x + i * (width + 10), y_offset, width, 30), kind, label, None))
+        y_offset += 40
 
-    # Resign Button (only during active game)
-    resign_rect = None
+    # Buttons, paired up so they stay on screen at the default window height
+    add_buttons(("flip", "Flip Board"), ("puzzles", "Puzzles"))
     if game_started and not game_over:
-        resign_rect = pygame.Rect(menu_start_x + 10, y_offset, button_width, 30)
-        pygame.draw.rect(screen, pygame.Color(255, 150, 150), resign_rect)
-        pygame.draw.rect(screen, pygame.Color(0, 0, 0), resign_rect, 2)
-        resign_text = font.render("Resign Game", True, pygame.Color(0, 0, 0))
-        screen.blit(resign_text, (menu_start_x + 15, y_offset + 6))
-        y_offset += 45
-    
-    # New Game Button
-    new_game_rect = pygame.Rect(menu_start_x + 10, y_offset, button_width, 30)
-    pygame.draw.rect(screen, pygame.Color(100, 150, 255), new_game_rect)
-    pygame.draw.rect(screen, pygame.Color(0, 0, 0), new_game_rect, 2)
-    new_game_text = font.render("New Game", True, pygame.Color(0, 0, 0))
-    screen.blit(new_game_text, (menu_start_x + 15, y_offset + 6))
+        if can_claim:
+            add_buttons(("resign", "Resign"), ("claim_draw", "Claim Draw"))
+        else:
+            add_buttons(("resign", "Resign Game"))
+    add_buttons(("new_game", "New Game"))
+    y_offset += 5
+
+    hit_items = [item for item in items if item[1] not in ("title", "playing_as")]
+    layout = {
+        "items": items,
+        "hit_tops": [item[0].top for item in hit_items],
+        "hit_items": hit_items,
+        "bottom": y_offset,
+    }
+    _menu_layout_cache.clear()  # Only the current size/state is ever needed
+    _menu_layout_cache[key] = layout
+    return layout
+
+def hit_test_menu(layout, pos):
+    """Return the clickable menu entry under pos, or None"""
+    tops = layout["hit_tops"]
+    end = bisect.bisect_right(tops, pos[1])
+    if end == 0:
+        return None
+    # Buttons sharing a row share a top
+    for item in layout["hit_items"][bisect.bisect_left(tops, tops[end - 1]):end]:
+        if item[0].collidepoint(pos):
+            return item
+    return None
+
+# === Draw Menu Panel ===
+def draw_menu_panel(screen, font, font_small, images, board, selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, game_over, game_result, game_started, move_history, status_note=None, review_summary=None, puzzle_mode=False, explorer=None, can_claim=False, menu_scroll=0):
+    """Draw the menu panel scrolled up by menu_scroll pixels; returns the height of its content"""
+    # Fill menu area with gray background
+    menu_start_x = MARGIN + BOARD_WIDTH + MARGIN
+    menu_rect = pygame.Rect(menu_start_x, 0, MENU_WIDTH, TOTAL_HEIGHT)
+    pygame.draw.rect(screen, pygame.Color(240, 240, 240), menu_rect)
 
-    y_offset += 45
+    section_spacing = max(15, TOTAL_HEIGHT // 40)
+    layout = get_menu_layout(game_started, game_over, can_claim)
+    selected = {
+        "player_color": player_color,
+        "elo": selected_elo,
+        "thinking_time": selected_thinking_time,
+        "piece_set": selected_piece_set,
+    }
+    button_colors = {
+        "flip": pygame.Color(150, 200, 255),
+        "resign": pygame.Color(255, 150, 150),
+        "claim_draw": pygame.Color(255, 220, 130),
+        "new_game": pygame.Color(100, 150, 255),
+        "puzzles": pygame.Color(200, 170, 255),
+    }
+    for rect, kind, label, value in layout["items"]:
+        if menu_scroll:
+            rect = rect.move(0, -menu_scroll)
+        if kind == "title":
+            title_text = render_text(font, label, pygame.Color(0, 0, 0))
+            screen.blit(title_text, rect.topleft)
+        elif kind == "playing_as":
+            # Show current player color when game is active
+            current_color = "White" if player_color == chess.WHITE else "Black"
+            title_text = render_text(font, f"Playing as: {current_color}", pygame.Color(0, 100, 0))
+            screen.blit(title_text, rect.topleft)
+        elif kind in selected:
+            color = pygame.Color(0, 100, 0) if value == selected[kind] else pygame.Color(50, 50, 50)
+            item_text = render_text(font_small, label, color)
+            screen.blit(item_text, rect.topleft)
+        else:
+            if kind == "flip" and board_flipped:
+                label += " ✓"
+            elif kind == "new_game" and puzzle_mode:
+                label = "Next Puzzle"
+            elif kind == "puzzles" and puzzle_mode:
+                label = "Exit Puzzles"
+            pygame.draw.rect(screen, button_colors[kind], rect)
+            pygame.draw.rect(screen, pygame.Color(0, 0, 0), rect, 2)
+            button_text = render_text(font, label, pygame.Color(0, 0, 0))
+            if button_text.get_width() > rect.width - 6:  # Half-width buttons fall back to the small font
+                button_text = render_text(font_small, label, pygame.Color(0, 0, 0))
+            screen.blit(button_text, button_text.get_rect(center=rect.center))
+
+    y_offset = layout["bottom"] - menu_scroll
 
     # Captured Pieces Section
     y_offset = draw_captured_pieces(screen, font, font_small, images, board, y_offset, menu_start_x)
@@ -422,43 +755,67 @@ def draw_menu_panel(screen, font, font_small, images, board, selected_elo, selec
     
     # Game Status
     if game_over:
-        status_text = font.render("Game Over!", True, pygame.Color(255, 0, 0))
+        status_text = render_text(font, "Game Over!", pygame.Color(255, 0, 0))
         screen.blit(status_text, (menu_start_x + 10, y_offset))
         y_offset += 30
 
-        result_text = font.render(game_result, True, pygame.Color(0, 0, 0))
+        result_text = render_text(font, game_result, pygame.Color(0, 0, 0))
         screen.blit(result_text, (menu_start_x + 10, y_offset))
     else:
-        status_text = font.render("Game Active", True, pygame.Color(0, 150, 0))
+        status_text = render_text(font, "Game Active", pygame.Color(0, 150, 0))
         screen.blit(status_text, (menu_start_x + 10, y_offset))
 
     y_offset += 30  # Add spacing after game status
 
+    # Background loading / engine readiness
+    if status_note:
+        note_text = render_text(font_small, status_note, pygame.Color(120, 120, 120))
+        screen.blit(note_text, (menu_start_x + 10, y_offset))
+        y_offset += 25
+
+    # Move review, once the game is over
+    if game_over and review_summary:
+        counts, pending, stopped = review_summary
+        lines = [
+            f"Best {counts['best']}  Good {counts['good']}  Inaccuracies {counts['inaccuracy']}",
+            f"Mistakes {counts['mistake']}  Blunders {counts['blunder']}",
+        ]
+        if stopped:
+            lines.append("Review unavailable (engine error)")
+        elif pending:
+            lines.append(f"Reviewing {pending} more...")
+        title_text = render_text(font, "Your Moves:", pygame.Color(0, 0, 0))
+        screen.blit(title_text, (menu_start_x + 10, y_offset))
+        y_offset += 25
+        for line in lines:
+            review_text = render_text(font_small, line, pygame.Color(50, 50, 50))
+            screen.blit(review_text, (menu_start_x + 10, y_offset))
+            y_offset += 20
+        y_offset += 10
+
     # Move History
-    y_offset = draw_move_history(screen, font, font_small, board, y_offset, menu_start_x)
-
-    return new_game_rect, flip_rect, resign_rect
-
-# === Get Game Result Text ===
-def get_game_result_text(board):
-    result = board.result()
-    if result == "1-0":
-        return "You Won!"
-    elif result == "0-1":
-        return "Stockfish Won!"
-    elif result == "1/2-1/2":
-        if board.is_stalemate():
-            return "Draw - Stalemate"
-        elif board.is_insufficient_material():
-            return "Draw - Insufficient Material"
-        elif board.is_seventyfive_moves():
-            return "Draw - 75 Move Rule"
-        elif board.is_fivefold_repetition():
-            return "Draw - Repetition"
-        else:
-            return "Draw"
-    else:
-        return "Game Ongoing"
+    y_offset = draw_move_history(screen, font, font_small, move_history, y_offset, menu_start_x)
+
+    # Opening Explorer (not for puzzles, which start mid-game)
+    if explorer and not puzzle_mode and not game_over:
+        y_offset = draw_opening_explorer(screen, font, font_small, explorer, board, y_offset, menu_start_x)
+
+    return y_offset + menu_scroll
+
+def scroll_menu(menu_scroll, menu_height, ticks):
+    """New menu scroll offset after some mouse wheel ticks (positive scrolls up)"""
+    return max(0, min(menu_height - TOTAL_HEIGHT, menu_scroll - ticks * MENU_SCROLL_STEP))
+
+# === Memory Panel (F3) ===
+def draw_memory_panel(screen, font_small, budget):
+    """Memory budget readout over the bottom-left of the board"""
+    lines = get_memory_lines(budget)
+    panel = pygame.Rect(MARGIN, MARGIN + BOARD_WIDTH - 8 - 18 * len(lines), BOARD_WIDTH * 3 // 4, 8 + 18 * len(lines))
+    screen.fill(pygame.Color(0, 0, 0, 200), panel)  # SRCALPHA overlays keep the alpha, the window ignores it
+    y_offset = panel.y + 4
+    for line in lines:
+        screen.blit(font_small.render(line, True, pygame.Color(255, 255, 255)), (panel.x + 6, y_offset))
+        y_offset += 18
 
 # === Play Sound Effect ===
 def play_sound(sounds, sound_name):
@@ -470,98 +827,208 @@ def play_sound(sounds, sound_name):
             pass  # Ignore sound errors
 
 # === Handle Menu Clicks ===
-def handle_menu_click(pos, selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, game_started):
-    x, y = pos
-    menu_start_x = MARGIN + BOARD_WIDTH + MARGIN
-    if x < menu_start_x:
-        return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False
-
-    y_offset = 20
-    section_spacing = max(15, TOTAL_HEIGHT // 40)
-    item_spacing = max(8, TOTAL_HEIGHT // 80)
-
-    # Check Player Color selection clicks (only if game not started)
-    if not game_started:
-        y_offset += 25
-        for label, color in PLAYER_COLORS.items():
-            if y_offset <= y <= y_offset + 20:
-                return selected_elo, selected_thinking_time, color, board_flipped, selected_piece_set, False, False, False
-            y_offset += 20
-        y_offset += section_spacing
-    else:
-        y_offset += 30
-
-    # Check ELO selection clicks
-    y_offset += 25
-    for label, elo in ELO_LEVELS.items():
-        if y_offset <= y <= y_offset + (item_spacing * 2 + 12):
-            return elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False
-        y_offset += item_spacing * 2 + 12
-    y_offset += section_spacing
-
-    # Check Thinking Time selection clicks
-    y_offset += 25
-    for label, time_val in THINKING_TIMES.items():
-        if y_offset <= y <= y_offset + (item_spacing * 2 + 12):
-            return selected_elo, time_val, player_color, board_flipped, selected_piece_set, False, False, False
-        y_offset += item_spacing * 2 + 12
-    y_offset += section_spacing
-
-    # Check Piece Set selection clicks
-    y_offset += 25
-    for label, folder in PIECE_SETS.items():
-        if y_offset <= y <= y_offset + 20:
-            return selected_elo, selected_thinking_time, player_color, board_flipped, folder, False, False, False
-        y_offset += 20
-    y_offset += section_spacing
-
-    # Check Flip Board button
-    if y_offset <= y <= y_offset + 30:
-        return selected_elo, selected_thinking_time, player_color, not board_flipped, selected_piece_set, False, True, False
-    y_offset += 45
-
-    # Check Resign button (only during active game)
-    if game_started:
-        if y_offset <= y <= y_offset + 30:
-            return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, True
-        y_offset += 45
-
-    # Check New Game button
-    if y_offset <= y <= y_offset + 30:
-        return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, True, False, False
+def handle_menu_click(pos, selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, game_started, game_over=False, can_claim=False):
+    unchanged = (selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False, False, False)
+    item = hit_test_menu(get_menu_layout(game_started, game_over, can_claim), pos)
+    if item is None:
+        return unchanged
+
+    kind, value = item[1], item[3]
+    if kind == "player_color":
+        return selected_elo, selected_thinking_time, value, board_flipped, selected_piece_set, False, False, False, False, False
+    if kind == "elo":
+        return value, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False, False, False
+    if kind == "thinking_time":
+        return selected_elo, value, player_color, board_flipped, selected_piece_set, False, False, False, False, False
+    if kind == "piece_set":
+        return selected_elo, selected_thinking_time, player_color, board_flipped, value, False, False, False, False, False
+    if kind == "flip":
+        return selected_elo, selected_thinking_time, player_color, not board_flipped, selected_piece_set, False, True, False, False, False
+    if kind == "resign":
+        return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, True, False, False
+    if kind == "new_game":
+        return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, True, False, False, False, False
+    if kind == "claim_draw":
+        return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False, False, True
+    if kind == "puzzles":
+        return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False, True, False
+    return unchanged
+
+# === Engine Command ===
+def get_engine_command():
+    """Command line for the engine, routed through engine_recorder.py when recording or replaying"""
+    recorder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "engine_recorder.py")
+    if ENGINE_REPLAY_FILE:
+        return [sys.executable, recorder, "replay", ENGINE_REPLAY_FILE, "--speed", str(ENGINE_REPLAY_SPEED)]
+    if ENGINE_RECORD_FILE:
+        return [sys.executable, recorder, "record", ENGINE_RECORD_FILE, STOCKFISH_PATH]
+    return STOCKFISH_PATH
+
+def parse_cpu_list(text):
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in filter(None, text.replace(" ", "").split(",")):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+def get_engine_cpus():
+    """Cores for engine processes, or None where affinity isn't supported (macOS, Windows)"""
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    available = os.sched_getaffinity(0)
+    cpus = parse_cpu_list(ENGINE_CPUS) & available if ENGINE_CPUS else available - {UI_CPU}
+    return cpus or available  # A single-core machine can't reserve one; ENGINE_NICE still favours the UI
+
+def pin_ui_thread(engine_cpus):
+    """Pin the pygame thread to UI_CPU when the engines have been kept off it.
+
+    Call it once the startup threads are running: threads started from this one
+    afterwards inherit the pin (the executor's workers drop it, see unpin_thread).
+    """
+    if engine_cpus and UI_CPU >= 0 and UI_CPU not in engine_cpus and UI_CPU in os.sched_getaffinity(0):
+        os.sched_setaffinity(0, {UI_CPU})  # Only this thread
+
+def unpin_thread(cpus):
+    """Thread pool initializer: give a worker back the cores the UI thread had before it was pinned"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+def open_engine(hash_mb=None, cpus=None):
+    """Connect to the shared engine server if one is configured, otherwise start a local engine"""
+    if ENGINE_SERVER:
+        from engine_server import RemoteEngine
+        return RemoteEngine(ENGINE_SERVER)
+    engine = chess.engine.SimpleEngine.popen_uci(get_engine_command())
+    # Placed after the spawn (this runs on a worker thread, where preexec_fn isn't safe)
+    place_process(get_engine_pid(engine), cpus, ENGINE_NICE)
+    # NumaPolicy and Threads first. Stockfish reads its allowed cores at startup, before the pin above,
+    # and its other policies bind search threads to whole NUMA nodes (UI_CPU's included), so a
+    # pinned engine gets "none": its threads then keep the affinity place_process gave them
+    numa_policy = ENGINE_NUMA_POLICY or ("none" if cpus else None)
+    if numa_policy and "NumaPolicy" in engine.options:
+        engine.configure({"NumaPolicy": numa_policy})
+    if ENGINE_THREADS and "Threads" in engine.options:
+        engine.configure({"Threads": min(ENGINE_THREADS, engine.options["Threads"].max)})
+    if hash_mb and "Hash" in engine.options:
+        engine.configure({"Hash": hash_mb})
+    # Set last: changing Hash or Threads afterwards would clear the loaded table
+    # Passed as given, not made absolute, so recorded sessions replay on another checkout
+    if ENGINE_HASH_FILE and "Hash File" in engine.options:
+        engine.configure({"Hash File": ENGINE_HASH_FILE})
+    return engine
+
+def close_engine(engine, save_hash=True):
+    """Save the engine's hash for the next session, then shut it down.
+
+    Pass save_hash=False once Hash has been resized: Stockfish only loads a
+    hash file saved at the size it starts with, so the save would be wasted.
+    """
+    if save_hash and ENGINE_HASH_FILE and "Save Hash" in getattr(engine, "options", {}):
+        try:
+            engine.configure({"Save Hash": None})
+            engine.ping()  # Wait until the file is written
+        except chess.engine.EngineError as e:
+            print(f"Could not save engine hash: {e}")
+    engine.quit()
 
-    return selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, False, False, False
+def discard_engine(engine):
+    """Shut down an engine after a failed search; one that has already died may not answer"""
+    try:
+        engine.quit()
+    except (chess.engine.EngineError, TimeoutError) as e:
+        print(f"Could not quit engine: {e}")
+
+def restart_engine(engine, hash_mb=None, cpus=None):
+    """Replace an engine whose search failed with a fresh one (a new connection for the engine server)"""
+    discard_engine(engine)
+    return open_engine(hash_mb, cpus)
+
+def play_cheap_move(engine, board, profile, rng=random):
+    """Weak-preset move: a node-limited MultiPV search and a weighted random pick (see game_core)"""
+    if not hasattr(engine, "analyse"):
+        return engine.play(board, get_cheap_play_limit(profile), cheap=profile)  # Engine server picks for us
+    infos = engine.analyse(board, get_cheap_play_limit(profile), multipv=profile["candidates"])
+    move, info = pick_cheap_move(infos, profile, rng)
+    if move is None:  # The search ended before reporting any line
+        return engine.play(board, get_cheap_play_limit(profile))
+    return chess.engine.PlayResult(move, None, info)
+
+def get_engine_pid(engine):
+    """OS pid of a local engine process, or None (no engine yet, or the engine server's)"""
+    try:
+        return engine.protocol.transport.get_pid()
+    except AttributeError:
+        return None
 
-# === Configure Engine ELO ===
-def configure_engine_elo(engine, target_elo):
+def resize_engine_hash(engine, hash_mb):
+    """Shrink the engine's Hash to fit the memory budget (this clears the table)"""
+    if "Hash" in getattr(engine, "options", {}):
+        try:
+            engine.configure({"Hash": hash_mb})
+        except chess.engine.EngineError as e:
+            print(f"Could not resize engine hash: {e}")
+
+# === Puzzles ===
+def start_puzzle(puzzle_db, puzzle_rating, solved_ids):
+    """Pick a puzzle near the player's rating and play the opponent's setup move"""
+    puzzle = pick_puzzle(puzzle_db, puzzle_rating, exclude=solved_ids)
+    if puzzle is None:
+        return None, None, None
+    board = puzzle["board"]
+    move_history = new_move_history(board)
+    push_move(board, move_history, puzzle["moves"][0])
+    puzzle["step"] = 1
+    return puzzle, board, move_history
+
+def check_puzzle_move(board, puzzle, move):
+    """True if move is the solution's next move (any mate counts on the final move)"""
+    if move == puzzle["moves"][puzzle["step"]]:
+        return True
+    if puzzle["step"] == len(puzzle["moves"]) - 1:
+        board.push(move)
+        is_mate = board.is_checkmate()
+        board.pop()
+        return is_mate
+    return False
+
+def update_puzzle_rating(rating, puzzle_rating, solved):
+    expected = 1 / (1 + 10 ** ((puzzle_rating - rating) / 400))
+    return round(rating + 32 * ((1 if solved else 0) - expected))
+
+# === Background Startup Loading ===
+FIRST_FRAME_BUDGET_MS = 100  # Target time from launch to the first drawn board
+
+def init_mixer():
+    """Open the audio device (main thread only, like every SDL subsystem init); False if there is none"""
     try:
-        # Set skill level based on ELO (0-20 scale, where 20 is strongest)
-        if target_elo <= 1000:
-            skill_level = 0
-        elif target_elo <= 1200:
-            skill_level = 3
-        elif target_elo <= 1400:
-            skill_level = 6
-        elif target_elo <= 1600:
-            skill_level = 10
-        elif target_elo <= 1800:
-            skill_level = 13
-        elif target_elo <= 2000:
-            skill_level = 16
-        elif target_elo <= 2200:
-            skill_level = 18
-        else:
-            skill_level = 20
-        
-        engine.configure({"Skill Level": skill_level})
-        
-        # Also limit depth for lower ELOs
-        if target_elo < 1600:
-            engine.configure({"Depth": min(10, max(1, target_elo // 200))})
-            
-    except:
-        # If configuration fails, continue with default settings
-        pass
+        pygame.mixer.init()
+    except pygame.error:
+        return False
+    return True
+
+def prefetch_piece_sets(executor, size):
+    """Queue background loads of every piece set at the given square size"""
+    return {folder: executor.submit(load_images, folder, size) for folder in PIECE_SETS.values()}
+
+def take_piece_set(piece_sets, asset_folder, size=None):
+    """Use a prefetched piece set if it's ready, otherwise load it now"""
+    future = piece_sets.get(asset_folder)
+    if future is not None and future.done() and future.exception() is None:
+        return future.result()
+    return load_images(asset_folder, size)
+
+def post_when_done(future, event_type, **attributes):
+    """Post a pygame event once a background job finishes, waking the main loop"""
+    future.add_done_callback(lambda done: pygame.event.post(pygame.event.Event(event_type, future=done, **attributes)))
+
+def get_loading_note(pending, engine):
+    """Short readiness text for the menu panel, or None once everything is loaded"""
+    if pending:
+        return "Loading " + ", ".join(sorted(pending)) + "..."
+    if engine is None:
+        return "Engine unavailable"
+    return None
 
 # === Main Function ===> VIEW ONLY BOARD
 # def main():
@@ -612,77 +1079,254 @@ def configure_engine_elo(engine, target_elo):
 
 # === Main Function ===> ENHANCED PLAYABILITY
 def main():
-    pygame.init()
-    pygame.mixer.init()  # Initialize sound mixer
+    startup_time = time.perf_counter()
+
+    # Only what the first frame needs is initialised here - sounds, the engine
+    # and other piece sets load on worker threads while the board is up
+    executor = ThreadPoolExecutor(max_workers=4, initializer=unpin_thread,
+                                  initargs=(os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None,))
+    # Reviews need a local engine of their own; its process starts on the review thread
+    review_enabled = MOVE_REVIEW_ENABLED and not (ENGINE_SERVER or ENGINE_REPLAY_FILE)
+    budget = None
+    if MEMORY_BUDGET_MB or MEMORY_DEBUG:
+        budget = new_memory_budget(MEMORY_BUDGET_MB, {"sprites": _sprite_cache, "text": _text_cache}, MEMORY_DEBUG,
+                                   reserved_engine_mb=REVIEW_HASH_MB if review_enabled else 0)
+    engine_hash_mb = budget["engine_hash_mb"] if budget else None
+    startup_hash_mb = engine_hash_mb  # Size the next session's engine loads the saved hash at
+    engine_cpus = get_engine_cpus()
+    pending = {
+        "engine": executor.submit(open_engine, engine_hash_mb, engine_cpus),
+    }
+    pygame.display.init()
+    pygame.font.init()
+    # SDL subsystems must be initialised on the main thread; only the decoding goes to the pool
+    pending["sounds"] = executor.submit(load_sounds) if init_mixer() else executor.submit(dict)
+    pygame.event.set_blocked(pygame.MOUSEMOTION)  # Nothing reacts to hovering, so don't wake up for it
+    for name, future in pending.items():
+        post_when_done(future, LOADED_EVENT, name=name)
+    if budget:
+        pygame.time.set_timer(MEMORY_SAMPLE_EVENT, SAMPLE_INTERVAL_MS)
+        sample_memory(budget)
+    show_memory_panel = MEMORY_DEBUG
 
     # Initialize with default size but make resizable
     initial_width = DEFAULT_BOARD_WIDTH + 200 + 2 * MARGIN
     initial_height = DEFAULT_BOARD_WIDTH + 2 * MARGIN
-    screen = pygame.display.set_mode((initial_width, initial_height), pygame.RESIZABLE)
-    pygame.display.set_caption("Enhanced Chess vs Stockfish")
+    textured = None
+    if RENDER_BACKEND == "texture":
+        textured = open_texture_renderer("Enhanced Chess vs Stockfish", (initial_width, initial_height))
+        # Labels and menu are still drawn in software, onto a transparent overlay
+        screen = pygame.Surface((initial_width, initial_height), pygame.SRCALPHA)
+    else:
+        screen = pygame.display.set_mode((initial_width, initial_height), pygame.RESIZABLE)
+        pygame.display.set_caption("Enhanced Chess vs Stockfish")
 
     # Update dimensions based on initial window size
     update_dimensions(initial_width, initial_height)
 
-    clock = pygame.time.Clock()
     font = pygame.font.Font(None, 24)  # Heading font
     font_small = pygame.font.Font(None, 20)  # Menu item font
 
     # Initialize game state
     board = chess.Board()
+    move_history = new_move_history(board)
     selected_piece_set = "assets-classic"  # Default piece set
-    images = load_images(selected_piece_set)
-    sounds = load_sounds()
-    engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
+    piece_size = TEXTURE_PIECE_SIZE if textured else None  # The texture backend never rescales sprites itself
+    images = load_images(selected_piece_set, piece_size)
+    piece_sets = prefetch_piece_sets(executor, piece_size or SQUARE_SIZE)
+    if textured:
+        upload_piece_textures(textured, images)
+    sounds = {}
+    engine = None
+    first_frame_ms = None
+    review = start_move_review(STOCKFISH_PATH, cpus=engine_cpus) if review_enabled else None
 
     selected_square = None
     selected_elo = 1200  # Default ELO
     selected_thinking_time = 0.5  # Default thinking time
     player_color = chess.WHITE  # Default: play as white
     board_flipped = False  # Default: not flipped
+    menu_scroll = 0  # Pixels the menu panel is scrolled up by
+    menu_height = 0  # Height of the menu panel's content, from the last frame
     game_over = False
     game_result = ""
     game_started = False  # Track if moves have been made
     running = True
     ai_thinking = False
-
-    # Configure initial engine strength
-    configure_engine_elo(engine, selected_elo)
+    engine_busy = False  # A search is running on the engine (even one for a game since replaced)
+    engine_elo = None  # ELO the engine is configured for; changed only between searches
+    engine_failures = 0  # Failed searches since the last good one
+    cheap_rng = random.Random(CHEAP_PLAY_SEED) if ENGINE_RECORD_FILE or ENGINE_REPLAY_FILE else random
+    puzzle_db = None  # Opened the first time puzzles are chosen
+    puzzle = None  # Current puzzle while in puzzle mode
+    puzzle_rating = DEFAULT_PUZZLE_RATING
+    solved_ids = set()
+    puzzle_note = None
+    explorer = new_opening_explorer(OPENING_DB_FILE)  # Just maps the file; pages are read on demand
+    broadcast = start_broadcast(BROADCAST_RELAY, BROADCAST_CHANNEL) if BROADCAST_RELAY else None
+    engine_eval = None  # White's centipawns from the last engine search, sent along with its move
+    # Only now: the loader, review and broadcast threads started above would have inherited the pin
+    pin_ui_thread(engine_cpus)
 
     while running:
-        clock.tick(FPS)
-        
-        # Check if game just ended
-        if not game_over and board.is_game_over():
+        # Check if game just ended (tracked per move, so this is a lookup rather than move generation)
+        outcome = get_tracked_outcome(move_history["termination"])
+        if not game_over and outcome is not None:
             game_over = True
-            game_result = get_game_result_text(board)
+            game_result = get_game_result_text(board, player_color, outcome)
             play_sound(sounds, 'game_end')
-
-        # Handle AI move when it's AI's turn
-        if not game_over and not ai_thinking and board.turn != player_color:
+            if review:
+                finish_move_review(review)
+
+        # A threefold repetition or fifty-move draw may be claimed on the player's turn
+        claimable = None
+        if not game_over and not ai_thinking and puzzle is None and board.turn == player_color:
+            claimable = get_claimable_draw(move_history["termination"])
+
+        # Spectators get only what changed since the last frame: new moves, a new game, the result
+        if broadcast:
+            sync_broadcast(broadcast, board, game_result, engine_eval)
+            engine_eval = None
+
+        # A Hash shrunk by the memory budget and a newly picked ELO are applied between searches;
+        # a command sent while one is running would cancel it
+        if budget and engine is not None and not engine_busy and engine_hash_mb != budget["engine_hash_mb"]:
+            engine_hash_mb = budget["engine_hash_mb"]
+            resize_engine_hash(engine, engine_hash_mb)
+            budget["engine_hash_applied_mb"] = engine_hash_mb
+        if engine is not None and not engine_busy and engine_elo != selected_elo:
+            configure_engine_elo(engine, selected_elo)
+            engine_elo = selected_elo
+
+        # Start the AI move in the background when it's AI's turn; ENGINE_MOVE_EVENT brings it back
+        if not game_over and not ai_thinking and not engine_busy and engine is not None and puzzle is None and board.turn != player_color:
             ai_thinking = True
-            result = engine.play(board, chess.engine.Limit(time=selected_thinking_time))
+            engine_busy = True
+            cheap_profile = get_cheap_play_profile(selected_elo)
+            if cheap_profile:
+                future = executor.submit(play_cheap_move, engine, board.copy(), cheap_profile, cheap_rng)
+            else:
+                future = executor.submit(engine.play, board.copy(), chess.engine.Limit(time=selected_thinking_time),
+                                         info=chess.engine.INFO_SCORE if broadcast else chess.engine.INFO_NONE)
+            post_when_done(future, ENGINE_MOVE_EVENT, board=board)
+
+        if textured is None:
+            # Clear screen
+            screen.fill(pygame.Color(50, 50, 50))  # Dark background
+
+            # Draw everything
+            draw_board(screen)
+            draw_board_labels(screen, font, board_flipped)
+            draw_selected_square(screen, selected_square, board_flipped)
+            draw_legal_moves(screen, board, selected_square, board_flipped)
+            draw_pieces(screen, board, images, board_flipped)
+        else:
+            # The board itself is drawn by the renderer underneath this overlay
+            screen.fill(pygame.Color(0, 0, 0, 0))
+            draw_board_labels(screen, font, board_flipped)
 
-            # Check if it's a capture
-            is_capture = board.piece_at(result.move.to_square) is not None
+        # Draw menu panel
+        menu_height = draw_menu_panel(screen, font, font_small, images, board, selected_elo,
+                                      selected_thinking_time, player_color, board_flipped,
+                                      selected_piece_set, game_over, game_result, game_started,
+                                      move_history, get_loading_note(pending, engine) or puzzle_note,
+                                      get_review_summary(review) if review and game_over and puzzle is None else None,
+                                      puzzle is not None, explorer, claimable is not None, menu_scroll)
+        menu_scroll = scroll_menu(menu_scroll, menu_height, 0)  # The panel may have got shorter
+        if budget and show_memory_panel:
+            draw_memory_panel(screen, font_small, budget)
+
+        if textured is None:
+            pygame.display.flip()
+        else:
+            present_textured_frame(textured, screen, board, selected_square, board_flipped)
 
-            board.push(result.move)
-            ai_thinking = False
+        if first_frame_ms is None:
+            first_frame_ms = (time.perf_counter() - startup_time) * 1000
+            budget_note = "" if first_frame_ms <= FIRST_FRAME_BUDGET_MS else f" (over {FIRST_FRAME_BUDGET_MS} ms budget)"
+            print(f"First frame in {first_frame_ms:.0f} ms{budget_note}")
 
-            # Play appropriate sound
-            if board.is_check():
-                play_sound(sounds, 'check')
-            elif is_capture:
-                play_sound(sounds, 'capture')
-            else:
-                play_sound(sounds, 'move')
-        
-        for event in pygame.event.get():
+        # Sleep until something happens (input, a finished search or loader); while the
+        # post-game review is running, wake up now and then to show its progress
+        reviewing = review and game_over and puzzle is None and get_review_summary(review)[1] > 0
+        events = [pygame.event.wait(REVIEW_POLL_MS if reviewing else 0)] + pygame.event.get()
+
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
                 break
 
-            elif event.type == pygame.VIDEORESIZE:
+            elif event.type == LOADED_EVENT:
+                # A background loader finished
+                del pending[event.name]
+                try:
+                    result = event.future.result()
+                except Exception as e:
+                    print(f"Failed to load {event.name}: {e}")
+                    continue
+                if event.name == "engine":
+                    engine = result  # Its strength is set to the selected ELO before the first search
+                    engine_elo = None
+                    if budget:
+                        budget["engine_hash_applied_mb"] = engine_hash_mb
+                elif event.name == "sounds":
+                    sounds = result
+
+            elif event.type == ENGINE_MOVE_EVENT:
+                engine_busy = False
+                if event.board is not board:
+                    continue  # Searched for a game that has since been replaced
+                ai_thinking = False
+                try:
+                    result = event.future.result()
+                except CancelledError:
+                    continue  # Interrupted by another engine command; the engine itself is fine, so search again
+                except chess.engine.EngineError as e:
+                    # The turn is searched again once a restarted engine has loaded
+                    engine_failures += 1
+                    if engine_failures > ENGINE_RESTARTS:
+                        print(f"Engine move failed, giving up on the engine: {e}")
+                        executor.submit(discard_engine, engine)
+                    else:
+                        print(f"Engine move failed, restarting the engine: {e}")
+                        pending["engine"] = executor.submit(restart_engine, engine, engine_hash_mb, engine_cpus)
+                        post_when_done(pending["engine"], LOADED_EVENT, name="engine")
+                    engine = None
+                    continue
+                engine_failures = 0
+                if game_over:
+                    continue  # Resigned while the engine was thinking
+
+                # Check if it's a capture
+                is_capture = board.piece_at(result.move.to_square) is not None
+
+                push_move(board, move_history, result.move)
+                if result.info.get("score") is not None:
+                    engine_eval = result.info["score"].white().score(mate_score=10000)
+
+                # Play appropriate sound
+                if board.is_check():
+                    play_sound(sounds, 'check')
+                elif is_capture:
+                    play_sound(sounds, 'capture')
+                else:
+                    play_sound(sounds, 'move')
+
+            elif event.type == MEMORY_SAMPLE_EVENT:
+                if sample_memory(budget, (get_engine_pid(engine), review and review["engine_pid"])):
+                    # Under pressure: drop the prefetched piece sets too (they're reloaded on demand)
+                    piece_sets = {}
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_memory_panel = not show_memory_panel
+                if budget is None:
+                    # No budget configured: sample for the panel only
+                    budget = new_memory_budget(0, {"sprites": _sprite_cache, "text": _text_cache})
+                    pygame.time.set_timer(MEMORY_SAMPLE_EVENT, SAMPLE_INTERVAL_MS)
+                set_memory_tracing(budget, show_memory_panel)
+                sample_memory(budget, (get_engine_pid(engine), review and review["engine_pid"]))
+
+            elif event.type == pygame.VIDEORESIZE and textured is None:
                 # Handle window resize
                 new_width = max(MIN_WINDOW_WIDTH, event.w)
                 new_height = max(MIN_WINDOW_HEIGHT, event.h)
@@ -690,18 +1334,36 @@ def main():
                 update_dimensions(new_width, new_height)
                 # Reload images with new square size
                 images = load_images(selected_piece_set)
+                piece_sets = prefetch_piece_sets(executor, SQUARE_SIZE)
+
+            elif event.type == pygame.WINDOWSIZECHANGED and textured is not None:
+                # Texture backend: the renderer scales the sprites, so only the layout and overlay change
+                new_width = max(MIN_WINDOW_WIDTH, event.x)
+                new_height = max(MIN_WINDOW_HEIGHT, event.y)
+                if (new_width, new_height) != (event.x, event.y):
+                    textured["window"].size = (new_width, new_height)
+                update_dimensions(new_width, new_height)
+                screen = pygame.Surface((new_width, new_height), pygame.SRCALPHA)
+
+            elif event.type == pygame.MOUSEWHEEL:
+                # Scroll the move history when the pointer is over it, otherwise the whole menu panel
+                mouse_pos = pygame.mouse.get_pos()
+                if move_history["rect"] and move_history["rect"].collidepoint(mouse_pos):
+                    scroll_move_history(move_history, event.y)
+                elif mouse_pos[0] >= MARGIN + BOARD_WIDTH + MARGIN:
+                    menu_scroll = scroll_menu(menu_scroll, menu_height, event.y)
 
-            elif event.type == pygame.MOUSEBUTTONDOWN:
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button not in (4, 5):  # Wheel ticks also arrive as buttons 4/5
                 mouse_pos = pygame.mouse.get_pos()
                 
-                # Handle menu clicks
-                new_elo, new_thinking_time, new_player_color, new_board_flipped, new_piece_set, start_new_game, flip_clicked, resign_clicked = handle_menu_click(
-                    mouse_pos, selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, game_started)
+                # Handle menu clicks (the layout is in unscrolled panel coordinates)
+                new_elo, new_thinking_time, new_player_color, new_board_flipped, new_piece_set, start_new_game, flip_clicked, resign_clicked, puzzles_clicked, claim_clicked = handle_menu_click(
+                    (mouse_pos[0], mouse_pos[1] + menu_scroll), selected_elo, selected_thinking_time, player_color, board_flipped, selected_piece_set, game_started, game_over,
+                    claimable is not None)
 
                 # Update settings
                 if new_elo != selected_elo:
-                    selected_elo = new_elo
-                    configure_engine_elo(engine, selected_elo)
+                    selected_elo = new_elo  # Sent to the engine once it isn't searching
 
                 if new_thinking_time != selected_thinking_time:
                     selected_thinking_time = new_thinking_time
@@ -714,7 +1376,9 @@ def main():
                 if new_piece_set != selected_piece_set:
                     selected_piece_set = new_piece_set
                     print(f"Loading piece set: {selected_piece_set}")
-                    images = load_images(selected_piece_set)
+                    images = take_piece_set(piece_sets, selected_piece_set, piece_size)
+                    if textured:
+                        upload_piece_textures(textured, images)
                     print(f"Images reloaded successfully")
 
                 if flip_clicked:
@@ -725,16 +1389,55 @@ def main():
                     game_over = True
                     game_result = "You Resigned - Stockfish Won!"
                     play_sound(sounds, 'game_end')
+                    if review:
+                        finish_move_review(review)
+
+                if claim_clicked:
+                    game_over = True
+                    game_result = get_game_result_text(board, player_color, chess.Outcome(claimable, None))
+                    play_sound(sounds, 'game_end')
+                    if review:
+                        finish_move_review(review)
+
+                if puzzles_clicked and puzzle is not None:
+                    # Leave puzzle mode for a normal game
+                    puzzle = None
+                    puzzle_note = None
+                    start_new_game = True
+                elif puzzles_clicked or (start_new_game and puzzle is not None):
+                    if puzzle_db is None and os.path.exists(PUZZLE_DB_FILE):
+                        puzzle_db = open_puzzle_db(PUZZLE_DB_FILE)
+                    if puzzle_db is None:
+                        puzzle_note = "No puzzle database (see puzzle_db.py)"
+                        continue
+                    next_puzzle, next_board, next_history = start_puzzle(puzzle_db, puzzle_rating, solved_ids)
+                    if next_puzzle is None:
+                        puzzle_note = "No puzzles left near your rating"
+                        continue
+                    puzzle, board, move_history = next_puzzle, next_board, next_history
+                    puzzle_note = f"Puzzle {puzzle['id']} ({puzzle['rating']}) - You: {puzzle_rating}"
+                    player_color = board.turn
+                    board_flipped = (player_color == chess.BLACK)
+                    selected_square = None
+                    game_over = False
+                    game_result = ""
+                    game_started = True
+                    ai_thinking = False
+                    if review:
+                        reset_move_review(review)
+                    continue
 
                 if start_new_game:
                     # Reset game
                     board = chess.Board()
+                    move_history = new_move_history(board)
+                    if review:
+                        reset_move_review(review)
                     selected_square = None
                     game_over = False
                     game_result = ""
                     game_started = False
                     ai_thinking = False
-                    configure_engine_elo(engine, selected_elo)
                     continue
                 
                 # Handle board clicks (only if game is not over, not AI thinking, and click is on board)
@@ -753,24 +1456,42 @@ def main():
                             selected_square = None
                             continue
 
-                        # Try to make the move
-                        move = chess.Move(selected_square, target_square)
+                        # Try to make the move (promotions always go to a queen)
+                        move = parse_player_move(board, selected_square, target_square)
 
-                        # Check for pawn promotion
-                        piece = board.piece_at(selected_square)
-                        if piece and piece.piece_type == chess.PAWN:
-                            promotion_rank = 7 if player_color == chess.WHITE else 0
-                            if chess.square_rank(target_square) == promotion_rank:
-                                move = chess.Move(selected_square, target_square, promotion=chess.QUEEN)
+                        if move is not None and puzzle is not None and not check_puzzle_move(board, puzzle, move):
+                            # A wrong move ends the puzzle
+                            game_over = True
+                            game_result = "Wrong Move - Puzzle Failed"
+                            puzzle_rating = update_puzzle_rating(puzzle_rating, puzzle["rating"], False)
+                            puzzle_note = f"Puzzle {puzzle['id']} ({puzzle['rating']}) - You: {puzzle_rating}"
+                            selected_square = None
+                            play_sound(sounds, 'game_end')
+                            continue
 
-                        if move in board.legal_moves:
+                        if move is not None:
                             # Check if it's a capture
                             is_capture = board.piece_at(target_square) is not None
 
-                            board.push(move)
+                            if review and puzzle is None:
+                                review_move(review, board, move)
+                            push_move(board, move_history, move)
                             selected_square = None
                             game_started = True  # Mark game as started
 
+                            if puzzle is not None:
+                                puzzle["step"] += 1
+                                if puzzle["step"] == len(puzzle["moves"]):
+                                    game_over = True
+                                    game_result = "Puzzle Solved!"
+                                    solved_ids.add(puzzle["id"])
+                                    puzzle_rating = update_puzzle_rating(puzzle_rating, puzzle["rating"], True)
+                                    puzzle_note = f"Puzzle {puzzle['id']} ({puzzle['rating']}) - You: {puzzle_rating}"
+                                else:
+                                    # Opponent's reply from the solution
+                                    push_move(board, move_history, puzzle["moves"][puzzle["step"]])
+                                    puzzle["step"] += 1
+
                             # Play appropriate sound
                             if board.is_check():
                                 play_sound(sounds, 'check')
@@ -781,25 +1502,24 @@ def main():
                         else:
                             selected_square = None
 
-        # Clear screen
-        screen.fill(pygame.Color(50, 50, 50))  # Dark background
-
-        # Draw everything
-        draw_board(screen)
-        draw_board_labels(screen, font, board_flipped)
-        draw_selected_square(screen, selected_square, board_flipped)
-        draw_legal_moves(screen, board, selected_square, board_flipped)
-        draw_pieces(screen, board, images, board_flipped)
 
-        # Draw menu panel
-        new_game_rect, flip_rect, resign_rect = draw_menu_panel(screen, font, font_small, images, board, selected_elo,
-                                                               selected_thinking_time, player_color, board_flipped,
-                                                               selected_piece_set, game_over, game_result, game_started)
-
-        
-        pygame.display.flip()
-
-    engine.quit()
+    # The engine may still be starting if the window was closed straight away
+    if "engine" in pending:
+        try:
+            engine = pending["engine"].result()
+        except Exception:
+            engine = None
+    if engine is not None:
+        close_engine(engine, save_hash=engine_hash_mb == startup_hash_mb)
+    if review:
+        stop_move_review(review)
+    if puzzle_db is not None:
+        close_puzzle_db(puzzle_db)
+    if explorer is not None:
+        close_opening_db(explorer["db"])
+    if broadcast:
+        stop_broadcast(broadcast)
+    executor.shutdown()
     pygame.quit()
 
 if __name__ == "__main__":
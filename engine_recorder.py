@@ -0,0 +1,189 @@
+"""Record and replay UCI engine traffic.
+
+Both modes behave like a UCI engine binary on stdin/stdout, so anything that
+talks to Stockfish through chess.engine can use them unchanged.
+
+Record - run the real engine and log every line in both directions:
+    python engine_recorder.py record game.jsonl /path/to/stockfish
+
+Replay - answer from a recording, no engine binary needed:
+    python engine_recorder.py replay game.jsonl            # recorded timing
+    python engine_recorder.py replay game.jsonl --speed 10 # 10x faster
+    python engine_recorder.py replay game.jsonl --speed 0  # no delays
+
+Replay expects exactly the recorded commands, in order, and exits with an
+error on the first one that differs (e.g. a changed engine option), so record
+again after changing how the game talks to the engine. Check that a recording
+still replays cleanly with:
+    python engine_recorder.py verify game.jsonl
+
+chess_game.py picks these up from the CHESS_ENGINE_RECORD,
+CHESS_ENGINE_REPLAY and CHESS_ENGINE_REPLAY_SPEED environment variables.
+
+The recording is JSON lines: {"t": seconds since start, "dir": "in"|"out", "line": ...}
+where "in" is a command sent to the engine and "out" is a line it printed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+# === Record ===
+def record(log_path, engine_command):
+    start = time.monotonic()
+    log_lock = threading.Lock()
+    engine = subprocess.Popen(engine_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              universal_newlines=True, bufsize=1)
+
+    with open(log_path, "w") as log:
+        def write_event(direction, line):
+            with log_lock:
+                log.write(json.dumps({"t": round(time.monotonic() - start, 6), "dir": direction, "line": line}) + "\n")
+                log.flush()
+
+        def pump_engine_output():
+            for line in engine.stdout:
+                line = line.rstrip("\n")
+                write_event("out", line)
+                sys.stdout.write(line + "\n")
+                sys.stdout.flush()
+
+        reader = threading.Thread(target=pump_engine_output, daemon=True)
+        reader.start()
+
+        for line in sys.stdin:
+            line = line.rstrip("\n")
+            write_event("in", line)
+            try:
+                engine.stdin.write(line + "\n")
+                engine.stdin.flush()
+            except BrokenPipeError:
+                break
+            if line.strip() == "quit":
+                break
+
+        try:
+            engine.stdin.close()
+        except BrokenPipeError:
+            pass
+        engine.wait()
+        reader.join(timeout=1)
+    return engine.returncode
+
+# === Replay ===
+def load_recording(log_path):
+    """Split a recording into the startup output and (command, responses) exchanges.
+
+    Response times are stored relative to the command that triggered them.
+    """
+    with open(log_path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+
+    startup = []
+    exchanges = []
+    for event in events:
+        if event["dir"] == "in":
+            if not event["line"].strip():
+                continue  # Blank lines are skipped on replay too
+            exchanges.append((event["line"], event["t"], []))
+        elif exchanges:
+            command, command_time, responses = exchanges[-1]
+            responses.append((event["t"] - command_time, event["line"]))
+        else:
+            startup.append((event["t"], event["line"]))
+    return startup, [(command, responses) for command, _, responses in exchanges]
+
+def replay(log_path, speed=1.0):
+    startup, exchanges = load_recording(log_path)
+
+    def emit(responses, since):
+        for delay, line in responses:
+            if speed > 0:
+                remaining = since + delay / speed - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+            sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    emit(startup, time.monotonic())
+
+    position = 0
+    for line in sys.stdin:
+        received = time.monotonic()
+        command = line.strip()
+        if not command:
+            continue
+        if command == "quit":
+            break
+
+        # Commands must match the recording line for line; anything else means the
+        # session has diverged and the recorded answers would be for another position
+        if position >= len(exchanges):
+            print(f"replay: no recorded response left for {command!r}", file=sys.stderr)
+            return 1
+        recorded_command, responses = exchanges[position]
+        position += 1
+        if recorded_command.strip() != command:
+            print(f"replay: out of sync at command {position}: got {command!r}, recorded {recorded_command!r}",
+                  file=sys.stderr)
+            return 1
+        emit(responses, received)
+    return 0
+
+def verify(log_path):
+    """Feed a recording's own commands to replay and check it answers with the recorded lines"""
+    startup, exchanges = load_recording(log_path)
+    commands = [command for command, _ in exchanges]
+    expected = [line for _, line in startup]
+    for command, responses in exchanges:
+        if command.strip() == "quit":
+            break
+        expected += [line for _, line in responses]
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "replay", log_path, "--speed", "0"],
+                            input="".join(command + "\n" for command in commands),
+                            capture_output=True, universal_newlines=True)
+    output = result.stdout.splitlines()
+    if result.returncode:
+        print(f"verify: replay exited with {result.returncode}: {result.stderr.strip()}", file=sys.stderr)
+        return 1
+    for index, (got, wanted) in enumerate(zip(output, expected)):
+        if got != wanted:
+            print(f"verify: output line {index + 1} is {got!r}, recorded {wanted!r}", file=sys.stderr)
+            return 1
+    if len(output) != len(expected):
+        print(f"verify: replay printed {len(output)} lines, recorded {len(expected)}", file=sys.stderr)
+        return 1
+    print(f"{log_path}: {len(commands)} commands, {len(expected)} responses replayed OK")
+    return 0
+
+# === Command Line ===
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay UCI engine traffic")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    record_parser = subparsers.add_parser("record", help="proxy a real engine and log its traffic")
+    record_parser.add_argument("log", help="recording file to write")
+    record_parser.add_argument("engine", nargs=argparse.REMAINDER, help="engine command line")
+
+    replay_parser = subparsers.add_parser("replay", help="serve responses from a recording")
+    replay_parser.add_argument("log", help="recording file to read")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="timing multiplier, 0 for no delays (default: 1)")
+
+    verify_parser = subparsers.add_parser("verify", help="check that replay reproduces a recording")
+    verify_parser.add_argument("log", help="recording file to check")
+
+    args = parser.parse_args()
+    if args.mode == "verify":
+        return verify(args.log)
+    if args.mode == "record":
+        if not args.engine:
+            parser.error("record needs an engine command")
+        return record(args.log, args.engine)
+    return replay(args.log, args.speed)
+
+if __name__ == "__main__":
+    sys.exit(main())
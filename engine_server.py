@@ -0,0 +1,303 @@
+"""Shared Stockfish server for many game clients.
+
+One host runs a bounded pool of engine processes; GUIs connect over TCP and
+get moves from whichever engine is free. Requests are queued per client and
+served round-robin, so one busy client can't starve the rest. Each request
+carries the client's ELO profile (Skill Level etc.), which is applied to the
+engine that picks it up.
+
+Server:
+    python engine_server.py --engine /path/to/stockfish --engines 4 --port 9999
+
+GUI (chess_game.py):
+    CHESS_ENGINE_SERVER=localhost:9999 python chess_game.py
+
+Wire format is one JSON object per line:
+    -> {"id": 1, "op": "play", "client": "kiosk-3", "fen": "...", "moves": ["e2e4"],
+        "options": {"Skill Level": 3}, "limit": {"time": 0.5}}
+    <- {"id": 1, "move": "e7e5"}      or      {"id": 1, "error": "..."}
+Weak presets add "cheap": {"nodes": 100, "candidates": 8, "temperature": 150}
+(see game_core.CHEAP_PLAY_PROFILES): the server runs a node-limited MultiPV
+search and picks the move, so such games cost milliseconds per move.
+"""
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from collections import deque
+
+import chess
+import chess.engine
+
+from game_core import get_cheap_play_limit, pick_cheap_move
+
+DEFAULT_PORT = 9999
+MAX_THINK_TIME = 5.0  # Server-side cap on a single search
+MAX_CHEAP_NODES = 5000  # Server-side caps on cheap-play requests
+MAX_CHEAP_CANDIDATES = 10
+# Only strength settings are taken from clients; Hash/Threads stay under the server's control
+PROFILE_OPTIONS = {"Skill Level", "UCI_LimitStrength", "UCI_Elo", "Depth"}
+
+# === Fair Scheduling ===
+class FairScheduler:
+    """Per-client FIFO queues served round-robin across clients"""
+
+    def __init__(self):
+        self.queues = {}  # client -> deque of jobs
+        self.ready = deque()  # clients with queued jobs, in serving order
+        self.condition = asyncio.Condition()
+
+    async def put(self, client, job):
+        async with self.condition:
+            queue = self.queues.setdefault(client, deque())
+            if not queue:
+                self.ready.append(client)
+            queue.append(job)
+            self.condition.notify()
+
+    async def get(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.ready)
+            client = self.ready.popleft()
+            queue = self.queues[client]
+            job = queue.popleft()
+            if queue:
+                self.ready.append(client)  # Back of the line for its next job
+            else:
+                del self.queues[client]
+            return job
+
+# === Engine Pool ===
+def build_board(request):
+    board = chess.Board(request.get("fen", chess.STARTING_FEN))
+    for uci in request.get("moves", []):
+        board.push_uci(uci)
+    return board
+
+def build_limit(request, max_time):
+    limit = request.get("limit", {})
+    think_time = limit.get("time")
+    if think_time is not None:
+        think_time = min(float(think_time), max_time)
+    elif limit.get("depth") is None and limit.get("nodes") is None:
+        think_time = max_time
+    return chess.engine.Limit(time=think_time, depth=limit.get("depth"), nodes=limit.get("nodes"))
+
+def build_cheap_profile(request):
+    """Client's cheap-play profile clamped to the server's caps, or None"""
+    cheap = request.get("cheap")
+    if not cheap:
+        return None
+    return {
+        "nodes": max(1, min(int(cheap.get("nodes", 100)), MAX_CHEAP_NODES)),
+        "candidates": max(1, min(int(cheap.get("candidates", 1)), MAX_CHEAP_CANDIDATES)),
+        "temperature": max(1.0, float(cheap.get("temperature", 1))),
+    }
+
+async def engine_worker(engine_command, scheduler, max_time, engine=None):
+    """Own one engine process (engine, if one was started already) and serve jobs from the
+    scheduler, restarting it if it dies; the engine is quit when the worker is cancelled"""
+    current_options = {}
+    try:
+        while True:
+            request, future = await scheduler.get()
+            if future.done():  # Client went away while queued
+                continue
+            try:
+                if engine is None:
+                    _, engine = await chess.engine.popen_uci(engine_command)
+                    current_options = {}
+
+                # Apply this client's profile, resetting anything the previous one set
+                options = {name: value for name, value in request.get("options", {}).items()
+                           if name in PROFILE_OPTIONS and name in engine.options}
+                changes = {}
+                for name in set(current_options) | set(options):
+                    value = options.get(name, engine.options[name].default)
+                    if current_options.get(name, engine.options[name].default) != value:
+                        changes[name] = value
+                if changes:
+                    await engine.configure(changes)
+                current_options = options
+
+                board = build_board(request)
+                cheap = build_cheap_profile(request)
+                if cheap:
+                    # Weak preset: a few hundred nodes of MultiPV, then a weighted random pick
+                    infos = await engine.analyse(board, get_cheap_play_limit(cheap), multipv=cheap["candidates"])
+                    move, _ = pick_cheap_move(infos, cheap)
+                    if move is None:  # No line reported; fall back to the engine's own bestmove
+                        move = (await engine.play(board, get_cheap_play_limit(cheap))).move
+                else:
+                    move = (await engine.play(board, build_limit(request, max_time))).move
+                future.set_result({"move": move.uci() if move else None})
+            except chess.engine.EngineTerminatedError as e:
+                engine = None
+                if not future.done():
+                    future.set_result({"error": f"engine terminated: {e}"})
+            except Exception as e:
+                if not future.done():
+                    future.set_result({"error": str(e)})
+    finally:
+        if engine is not None:
+            try:
+                await asyncio.wait_for(engine.quit(), 5)
+            except Exception:
+                pass  # Already dead, or hung and killed along with the event loop
+
+# === Client Connections ===
+async def handle_client(reader, writer, scheduler):
+    peer = writer.get_extra_info("peername")
+    pending = set()
+
+    async def answer(request):
+        response = {"id": request.get("id")}
+        if request.get("op") == "ping":
+            response["pong"] = True
+        elif request.get("op") == "play":
+            future = asyncio.get_running_loop().create_future()
+            await scheduler.put(request.get("client") or str(peer), (request, future))
+            response.update(await future)
+        else:
+            response["error"] = f"unknown op {request.get('op')!r}"
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except ValueError:
+                writer.write(b'{"error": "bad request"}\n')
+                continue
+            task = asyncio.create_task(answer(request))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except ConnectionError:
+        pass
+    finally:
+        for task in pending:
+            task.cancel()
+        writer.close()
+
+async def serve(engine_command, engines, host, port, max_time):
+    scheduler = FairScheduler()
+    workers = [asyncio.create_task(engine_worker(engine_command, scheduler, max_time)) for _ in range(engines)]
+    server = await asyncio.start_server(lambda r, w: handle_client(r, w, scheduler), host, port)
+    print(f"Engine server on {host}:{port} with {engines} engine(s)")
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+# === Client Side ===
+class ConnectionPool:
+    """Blocking pool of JSON-line connections to an engine server, reconnecting on failure"""
+
+    def __init__(self, host, port, size=2, timeout=30.0, retries=3):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.retries = retries
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+        self.next_id = 0
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, sock.makefile("rwb")
+
+    def request(self, payload):
+        last_error = None
+        for attempt in range(self.retries):
+            with self.slots:
+                with self.lock:
+                    self.next_id += 1
+                    payload["id"] = self.next_id
+                    connection = self.idle.pop() if self.idle else None
+                try:
+                    if connection is None:
+                        connection = self._connect()
+                    sock, stream = connection
+                    stream.write((json.dumps(payload) + "\n").encode())
+                    stream.flush()
+                    line = stream.readline()
+                    if not line:
+                        raise ConnectionError("engine server closed the connection")
+                    with self.lock:
+                        self.idle.append(connection)
+                    return json.loads(line)
+                except OSError as e:
+                    # Drop the broken connection and retry on a fresh one
+                    if connection is not None:
+                        connection[0].close()
+                    last_error = e
+            time.sleep(0.2 * 2 ** attempt)
+        raise chess.engine.EngineTerminatedError(f"engine server {self.address[0]}:{self.address[1]} unreachable: {last_error}")
+
+    def close(self):
+        with self.lock:
+            for sock, _ in self.idle:
+                sock.close()
+            self.idle = []
+
+class RemoteEngine:
+    """Stand-in for chess.engine.SimpleEngine that gets its moves from an engine server"""
+
+    def __init__(self, address, client_id=None, pool_size=2):
+        host, _, port = address.rpartition(":")
+        self.pool = ConnectionPool(host or "localhost", int(port or DEFAULT_PORT), pool_size)
+        self.client_id = client_id or socket.gethostname()
+        self.options = {}  # This client's ELO profile, sent with every request
+
+    def configure(self, options):
+        self.options.update(options)
+
+    def play(self, board, limit, cheap=None, **kwargs):
+        """Like SimpleEngine.play; cheap is a game_core cheap-play profile for weak presets"""
+        request = {
+            "op": "play",
+            "client": self.client_id,
+            "fen": board.root().fen(),
+            "moves": [move.uci() for move in board.move_stack],
+            "options": self.options,
+            "limit": {name: getattr(limit, name) for name in ("time", "depth", "nodes")
+                      if getattr(limit, name) is not None},
+        }
+        if cheap:
+            request["cheap"] = cheap
+        response = self.pool.request(request)
+        if "error" in response:
+            raise chess.engine.EngineError(response["error"])
+        move = chess.Move.from_uci(response["move"]) if response.get("move") else None
+        return chess.engine.PlayResult(move, None)
+
+    def quit(self):
+        self.pool.close()
+
+# === Command Line ===
+def main():
+    parser = argparse.ArgumentParser(description="Serve Stockfish moves to many chess_game.py clients")
+    parser.add_argument("--engine", required=True, help="path to the Stockfish binary")
+    parser.add_argument("--engines", type=int, default=2, help="engine processes in the pool (default: 2)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-time", type=float, default=MAX_THINK_TIME,
+                        help=f"longest search a client may ask for, in seconds (default: {MAX_THINK_TIME})")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.engine, args.engines, args.host, args.port, args.max_time))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""Statistics across a corpus of played games, computed on NumPy bitboard arrays.
+
+Decode once (streams the PGN; evals are read from Lichess-style [%eval] comments):
+    python game_analytics.py decode games.pgn.gz corpus/
+    python game_analytics.py analyse corpus/
+    python game_analytics.py bench games.pgn --games 2000
+
+Each position before a move is stored as 12 uint64 bitboards (white P N B R Q K,
+then black, like the pieces in stockfish/src/bitboard.h) plus the move, the
+mover's Elo and the eval after the move, in batches of BATCH_POSITIONS
+(positions-NNNNN.npz, one array per column). Games never span batches.
+
+analyse works batch by batch with vectorised popcounts and masks and writes
+per-position columns (features-NNNNN.npz) and the corpus totals (summary.npz):
+material curve by ply, piece heatmaps, and blunder squares per ELO preset.
+Blunders use the same expected-score model and threshold as move_review.py.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import chess
+import chess.pgn
+
+from move_review import WIN_RATE_AS, WIN_RATE_BS, MOVE_CLASSES, expected_score_from_cp
+from opening_explorer import open_pgn, game_label, LABEL_TAGS
+
+PIECE_PLANES = "PNBRQKpnbrqk"
+PIECE_VALUES = np.array([1, 3, 3, 5, 9, 0])  # Pawn .. king, as counted by the win-rate model
+ELO_PRESETS = np.array([800, 1200, 1600, 2000, 2400, 2800])  # ELO_LEVELS in chess_game.py
+BLUNDER_LOSS = MOVE_CLASSES[0][0]
+BATCH_POSITIONS = 1 << 16
+MATE_CP = 10000  # Centipawns stored for a forced mate
+NO_EVAL = -32768
+MAX_CURVE_PLY = 200
+
+# === Decoding ===
+def new_batch():
+    return {"bitboards": [], "turn": [], "from_square": [], "to_square": [], "ply": [], "game": [], "elo": [], "eval": []}
+
+class BitboardVisitor(chess.pgn.BaseVisitor):
+    """Appends every mainline position of a game to a batch, without building a game tree"""
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.game = -1
+        self.skipped = 0
+
+    def begin_game(self):
+        self.game += 1
+        self.ply = 0
+        self.elo = [0, 0]
+        self.tags = {}
+        self.start = len(self.batch["ply"])  # First row of this game, for rolling it back
+        self.error = None
+
+    def visit_header(self, tagname, tagvalue):
+        if tagname in ("WhiteElo", "BlackElo") and tagvalue.isdigit():
+            self.elo[tagname == "BlackElo"] = min(int(tagvalue), 65535)
+        elif tagname in LABEL_TAGS:
+            self.tags[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        if self.error is not None:
+            return
+        batch = self.batch
+        white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+        pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+        batch["bitboards"].extend([bb & white for bb in pieces])
+        batch["bitboards"].extend([bb & black for bb in pieces])
+        batch["turn"].append(board.turn)
+        batch["from_square"].append(move.from_square)
+        batch["to_square"].append(move.to_square)
+        batch["ply"].append(self.ply)
+        batch["game"].append(self.game)
+        batch["elo"].append(self.elo[board.turn == chess.BLACK])
+        batch["eval"].append(NO_EVAL)
+        self.ply += 1
+
+    def visit_comment(self, comment):
+        match = chess.pgn.EVAL_REGEX.search(comment)
+        if match is None or self.ply == 0 or self.error is not None:
+            return
+        if match.group("mate"):
+            cp = MATE_CP if int(match.group("mate")) > 0 else -MATE_CP
+        else:
+            cp = max(-MATE_CP, min(MATE_CP, round(float(match.group("cp")) * 100)))
+        self.batch["eval"][-1] = cp  # White's point of view, after the last move
+
+    def handle_error(self, error):
+        """Skip a game with an illegal or unreadable move, dropping the rows it already added"""
+        if self.error is None:
+            print(f"Skipping {game_label(self.tags)}: {error}", file=sys.stderr)
+            self.skipped += 1
+            for name, column in self.batch.items():
+                del column[self.start * (12 if name == "bitboards" else 1):]
+        self.error = error
+
+    def result(self):
+        return self.ply
+
+def write_batch(batch, path):
+    np.savez(
+        path,
+        bitboards=np.array(batch["bitboards"], dtype=np.uint64).reshape(-1, 12),
+        turn=np.array(batch["turn"], dtype=bool),
+        from_square=np.array(batch["from_square"], dtype=np.uint8),
+        to_square=np.array(batch["to_square"], dtype=np.uint8),
+        ply=np.array(batch["ply"], dtype=np.uint16),
+        game=np.array(batch["game"], dtype=np.uint32),
+        elo=np.array(batch["elo"], dtype=np.uint16),
+        eval=np.array(batch["eval"], dtype=np.int16),
+    )
+
+def decode_games(pgn_paths, out_dir, batch_positions=BATCH_POSITIONS):
+    """Stream PGN files into positions-NNNNN.npz batches; returns (games, positions)"""
+    os.makedirs(out_dir, exist_ok=True)
+    batch = new_batch()
+    visitor = BitboardVisitor(batch)
+    batches = positions = 0
+    for path in pgn_paths:
+        with open_pgn(path) as handle:
+            while chess.pgn.read_game(handle, Visitor=lambda: visitor) is not None:
+                if len(batch["ply"]) >= batch_positions:
+                    positions += len(batch["ply"])
+                    write_batch(batch, os.path.join(out_dir, f"positions-{batches:05}.npz"))
+                    batches += 1
+                    for column in batch.values():
+                        column.clear()
+    if batch["ply"]:
+        positions += len(batch["ply"])
+        write_batch(batch, os.path.join(out_dir, f"positions-{batches:05}.npz"))
+    return visitor.game + 1 - visitor.skipped, positions
+
+def iter_batches(corpus_dir):
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "positions-*.npz"))):
+        with np.load(path) as data:
+            yield path, {name: data[name] for name in data.files}
+
+# === Vectorised Features ===
+def popcount(bitboards):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards)
+    # SWAR popcount for NumPy < 2.0
+    x = bitboards - ((bitboards >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+def expected_score(cp, material):
+    """move_review.expected_score_from_cp over arrays of centipawns and material counts"""
+    m = np.clip(material, 17, 78) / 58.0
+    a = np.polyval(WIN_RATE_AS, m)
+    b = np.polyval(WIN_RATE_BS, m)
+    value = cp * a / 100
+    win = 1 / (1 + np.exp(np.minimum(700.0, (a - value) / b)))
+    loss = 1 / (1 + np.exp(np.minimum(700.0, (a + value) / b)))
+    return win + (1 - win - loss) / 2
+
+def batch_features(batch):
+    """Per-position feature columns for one batch"""
+    counts = popcount(batch["bitboards"]).astype(np.int32)
+    material_white = counts[:, :6] @ PIECE_VALUES
+    material_black = counts[:, 6:] @ PIECE_VALUES
+
+    # The eval before a move is the eval after the previous move of the same game
+    evals = batch["eval"].astype(np.float64)
+    has_eval = batch["eval"] != NO_EVAL
+    has_before = np.roll(has_eval, 1) & (np.roll(batch["game"], 1) == batch["game"])
+    has_before[:1] = False
+    mover = np.where(batch["turn"], 1.0, -1.0)
+    material = material_white + material_black
+    before = expected_score(mover * np.roll(evals, 1), material)
+    after = expected_score(mover * evals, material)
+    loss = np.where(has_eval & has_before, np.maximum(0.0, before - after), np.nan).astype(np.float32)
+
+    return {
+        "game": batch["game"],
+        "ply": batch["ply"],
+        "material_white": material_white.astype(np.uint8),
+        "material_black": material_black.astype(np.uint8),
+        "loss": loss,
+        "blunder": loss >= BLUNDER_LOSS,
+    }
+
+def new_summary():
+    return {
+        "positions": 0,
+        "heatmap": np.zeros((12, 64), dtype=np.int64),  # Plane x square occupancy counts
+        "blunder_squares": np.zeros((len(ELO_PRESETS), 64), dtype=np.int64),  # Preset x destination square
+        "moves_per_preset": np.zeros(len(ELO_PRESETS), dtype=np.int64),
+        "curve_sum": np.zeros(MAX_CURVE_PLY),  # Material balance (white - black) summed by ply
+        "curve_count": np.zeros(MAX_CURVE_PLY, dtype=np.int64),
+    }
+
+def update_summary(summary, batch, features):
+    n = len(batch["ply"])
+    summary["positions"] += n
+
+    # Square i is bit i of each bitboard
+    bits = np.unpackbits(batch["bitboards"].astype("<u8").view(np.uint8), axis=1, bitorder="little")
+    summary["heatmap"] += bits.reshape(n, 12, 64).sum(axis=0, dtype=np.int64)
+
+    rated = batch["elo"] > 0
+    preset = np.abs(batch["elo"][:, None].astype(np.int32) - ELO_PRESETS).argmin(axis=1)
+    reviewed = rated & ~np.isnan(features["loss"])
+    summary["moves_per_preset"] += np.bincount(preset[reviewed], minlength=len(ELO_PRESETS))
+    blunders = rated & features["blunder"]
+    np.add.at(summary["blunder_squares"], (preset[blunders], batch["to_square"][blunders]), 1)
+
+    ply = batch["ply"].astype(np.int64)
+    in_curve = ply < MAX_CURVE_PLY
+    balance = features["material_white"].astype(np.int64) - features["material_black"]
+    summary["curve_sum"] += np.bincount(ply[in_curve], weights=balance[in_curve], minlength=MAX_CURVE_PLY)
+    summary["curve_count"] += np.bincount(ply[in_curve], minlength=MAX_CURVE_PLY)
+
+def analyse_corpus(corpus_dir):
+    """Write features-NNNNN.npz next to each batch and summary.npz; returns the summary"""
+    summary = new_summary()
+    for path, batch in iter_batches(corpus_dir):
+        features = batch_features(batch)
+        update_summary(summary, batch, features)
+        np.savez(path.replace("positions-", "features-"), **features)
+    np.savez(os.path.join(corpus_dir, "summary.npz"), elo_presets=ELO_PRESETS, **summary)
+    return summary
+
+# === Per-Board Baseline ===
+def read_games(pgn_path, limit=None):
+    """(elos, moves, evals) per game, for the per-Board baseline"""
+    games = []
+    with open_pgn(pgn_path) as handle:
+        while limit is None or len(games) < limit:
+            game = chess.pgn.read_game(handle)
+            if game is None:
+                break
+            elos = [int(game.headers.get(tag, "0")) if game.headers.get(tag, "").isdigit() else 0
+                    for tag in ("WhiteElo", "BlackElo")]
+            moves, evals = [], []
+            for node in game.mainline():
+                moves.append(node.move)
+                score = node.eval()
+                evals.append(None if score is None else score.white().score(mate_score=MATE_CP))
+            games.append((elos, moves, evals))
+    return games
+
+def board_loop_summary(games):
+    """The same totals computed one python-chess Board at a time"""
+    summary = new_summary()
+    for elos, moves, evals in games:
+        board = chess.Board()
+        previous = None
+        for ply, (move, cp) in enumerate(zip(moves, evals)):
+            summary["positions"] += 1
+            material = {}
+            for color in chess.COLORS:
+                material[color] = sum(len(board.pieces(piece_type, color)) * int(PIECE_VALUES[piece_type - 1])
+                                      for piece_type in chess.PIECE_TYPES)
+            for square, piece in board.piece_map().items():
+                summary["heatmap"][PIECE_PLANES.index(piece.symbol()), square] += 1
+            if ply < MAX_CURVE_PLY:
+                summary["curve_sum"][ply] += material[chess.WHITE] - material[chess.BLACK]
+                summary["curve_count"][ply] += 1
+
+            elo = elos[board.turn == chess.BLACK]
+            if elo and cp is not None and previous is not None:
+                preset = int(np.abs(ELO_PRESETS - elo).argmin())
+                sign = 1 if board.turn == chess.WHITE else -1
+                loss = expected_score_from_cp(sign * previous, board) - expected_score_from_cp(sign * cp, board)
+                summary["moves_per_preset"][preset] += 1
+                if loss >= BLUNDER_LOSS:
+                    summary["blunder_squares"][preset, move.to_square] += 1
+            previous = cp
+            board.push(move)
+    return summary
+
+# === Command Line ===
+def print_report(summary):
+    print(f"{summary['positions']} positions")
+    counts = summary["curve_count"]
+    for ply in (10, 20, 40, 60, 80):
+        if ply < MAX_CURVE_PLY and counts[ply]:
+            print(f"  material balance at ply {ply}: {summary['curve_sum'][ply] / counts[ply]:+.2f}")
+    for preset, squares, moves in zip(ELO_PRESETS, summary["blunder_squares"], summary["moves_per_preset"]):
+        if not moves:
+            continue
+        top = [f"{chess.square_name(square)} ({squares[square]})" for square in np.argsort(squares)[::-1][:3] if squares[square]]
+        print(f"  {preset}: {squares.sum()} blunders in {moves} reviewed moves; most on {', '.join(top) or '-'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorised statistics over stored games")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    decode_parser = subparsers.add_parser("decode", help="decode PGN files into bitboard batches")
+    decode_parser.add_argument("pgn", nargs="+")
+    decode_parser.add_argument("corpus")
+    analyse_parser = subparsers.add_parser("analyse", help="compute features and totals for a decoded corpus")
+    analyse_parser.add_argument("corpus")
+    bench_parser = subparsers.add_parser("bench", help="compare against a per-Board loop")
+    bench_parser.add_argument("pgn")
+    bench_parser.add_argument("--games", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.mode == "decode":
+        games, positions = decode_games(args.pgn, args.corpus)
+        print(f"Decoded {games} games ({positions} positions) into {args.corpus}")
+        return 0
+    if args.mode == "analyse":
+        print_report(analyse_corpus(args.corpus))
+        return 0
+
+    games = read_games(args.pgn, args.games)
+    with tempfile.TemporaryDirectory() as corpus:
+        sample = os.path.join(corpus, "sample.pgn")
+        with open_pgn(args.pgn) as src, open(sample, "w") as dst:
+            exporter = chess.pgn.FileExporter(dst)
+            for _ in range(len(games)):
+                chess.pgn.read_game(src).accept(exporter)
+        started = time.perf_counter()
+        decode_games([sample], corpus)
+        decode_time = time.perf_counter() - started
+        started = time.perf_counter()
+        summary = analyse_corpus(corpus)
+        vector_time = time.perf_counter() - started
+    started = time.perf_counter()
+    baseline = board_loop_summary(games)
+    loop_time = time.perf_counter() - started
+
+    matches = all(np.allclose(summary[key], baseline[key]) for key in summary)
+    print(f"{summary['positions']} positions from {len(games)} games (totals match: {matches})")
+    print(f"  per-Board loop:      {loop_time:.2f}s")
+    print(f"  vectorised analyse:  {vector_time:.2f}s ({loop_time / vector_time:.0f}x)")
+    print(f"  one-off decode:      {decode_time:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Game rules, engine strength settings and result detection, without pygame.
+
+Shared by the desktop GUI (chess_game.py) and the web game server
+(game_server.py). A game is a plain dict so it can be snapshotted as JSON.
+"""
+import os
+import math
+import random
+
+import chess
+import chess.engine
+import chess.polyglot
+
+DRAW_TEXTS = {
+    chess.Termination.STALEMATE: "Draw - Stalemate",
+    chess.Termination.INSUFFICIENT_MATERIAL: "Draw - Insufficient Material",
+    chess.Termination.SEVENTYFIVE_MOVES: "Draw - 75 Move Rule",
+    chess.Termination.FIVEFOLD_REPETITION: "Draw - Repetition",
+    chess.Termination.THREEFOLD_REPETITION: "Draw Claimed - Repetition",
+    chess.Termination.FIFTY_MOVES: "Draw Claimed - 50 Move Rule",
+}
+
+# === Get Game Result Text ===
+def get_game_result_text(board, player_color=chess.WHITE, outcome=None):
+    """Result text from the player's point of view; pass a tracked outcome to skip recomputing it"""
+    outcome = outcome or board.outcome()
+    if outcome is None:
+        return "Game Ongoing"
+    if outcome.winner == player_color:
+        return "You Won!"
+    elif outcome.winner is not None:
+        return "Stockfish Won!"
+    return DRAW_TEXTS.get(outcome.termination, "Draw")
+
+# === Termination Tracking ===
+# board.is_game_over() regenerates legal moves and walks the move stack for
+# repetitions every time it's asked. The tracker does that work once per push
+# instead: a Zobrist-hash occurrence table for repetitions, and a stack with
+# the outcome (and any claimable draw) of every position reached, so checks
+# are O(1) and a pop just drops the top entry.
+def new_termination_tracker(board):
+    tracker = {"counts": {}, "stack": []}
+    replay = board.root()
+    for move in board.move_stack:
+        track_push(tracker, replay, lazy=True)
+        replay.push(move)
+    track_push(tracker, board)
+    return tracker
+
+def get_position_status(board, repetitions):
+    """(outcome, claimable termination) of a position that has occurred repetitions times"""
+    has_moves = any(board.generate_legal_moves())
+    if not has_moves and board.is_check():
+        return chess.Outcome(chess.Termination.CHECKMATE, not board.turn), None
+    if board.is_insufficient_material():
+        return chess.Outcome(chess.Termination.INSUFFICIENT_MATERIAL, None), None
+    if not has_moves:
+        return chess.Outcome(chess.Termination.STALEMATE, None), None
+    if board.halfmove_clock >= 150:
+        return chess.Outcome(chess.Termination.SEVENTYFIVE_MOVES, None), None
+    if repetitions >= 5:
+        return chess.Outcome(chess.Termination.FIVEFOLD_REPETITION, None), None
+    if board.halfmove_clock >= 100:
+        return None, chess.Termination.FIFTY_MOVES
+    if repetitions >= 3:
+        return None, chess.Termination.THREEFOLD_REPETITION
+    return None, None
+
+def track_push(tracker, board, lazy=False):
+    """Record the position just reached by board.push (lazy leaves its status until it's needed)"""
+    key = chess.polyglot.zobrist_hash(board)
+    repetitions = tracker["counts"].get(key, 0) + 1
+    tracker["counts"][key] = repetitions
+    tracker["stack"].append([key, None if lazy else get_position_status(board, repetitions)])
+
+def track_pop(tracker, board):
+    """Forget the position left by board.pop"""
+    key, _ = tracker["stack"].pop()
+    repetitions = tracker["counts"][key] - 1
+    if repetitions:
+        tracker["counts"][key] = repetitions
+    else:
+        del tracker["counts"][key]
+    top = tracker["stack"][-1]
+    if top[1] is None:
+        top[1] = get_position_status(board, tracker["counts"][top[0]])
+
+def get_tracked_outcome(tracker):
+    """Outcome of the current position, or None while the game goes on"""
+    return tracker["stack"][-1][1][0]
+
+def get_claimable_draw(tracker):
+    """Termination the side to move may claim a draw by (threefold / fifty moves), or None"""
+    return tracker["stack"][-1][1][1]
+
+# === Engine Strength ===
+# Weak presets don't use Skill Level, which searches for the full think time
+# with MultiPV on top. They run a search of a few hundred nodes (a couple of
+# milliseconds) and pick at random among its best candidates, weighted by a
+# softmax of their scores: exp((score - best) / temperature).
+CHEAP_PLAY_PROFILES = [  # (highest ELO, profile), checked in order
+    (800, {"nodes": 100, "candidates": 8, "temperature": 150}),
+    (1200, {"nodes": 500, "candidates": 5, "temperature": 60}),
+]
+
+def get_cheap_play_profile(target_elo):
+    """Node-budgeted play settings for weak presets, or None to search normally"""
+    for max_elo, profile in CHEAP_PLAY_PROFILES:
+        if target_elo <= max_elo:
+            return profile
+    return None
+
+def get_cheap_play_limit(profile):
+    return chess.engine.Limit(nodes=profile["nodes"])
+
+def pick_cheap_move(infos, profile, rng=random):
+    """Choose among a MultiPV analysis's first moves; returns (move, info of that line),
+    or (None, None) if no line was reported (the caller then plays the engine's bestmove)"""
+    candidates = [info for info in infos if info.get("pv") and "score" in info]
+    if not candidates:
+        return None, None
+    scores = [info["score"].relative.score(mate_score=10000) for info in candidates]
+    best = max(scores)
+    weights = [math.exp((score - best) / profile["temperature"]) for score in scores]
+    info = rng.choices(candidates, weights)[0]
+    return info["pv"][0], info
+
+def get_engine_options(target_elo):
+    """UCI options that approximate the target ELO"""
+    if get_cheap_play_profile(target_elo):
+        return {"Skill Level": 20}  # Weakened by the move choice instead (see above)
+
+    # Set skill level based on ELO (0-20 scale, where 20 is strongest)
+    if target_elo <= 1000:
+        skill_level = 0
+    elif target_elo <= 1200:
+        skill_level = 3
+    elif target_elo <= 1400:
+        skill_level = 6
+    elif target_elo <= 1600:
+        skill_level = 10
+    elif target_elo <= 1800:
+        skill_level = 13
+    elif target_elo <= 2000:
+        skill_level = 16
+    elif target_elo <= 2200:
+        skill_level = 18
+    else:
+        skill_level = 20
+    options = {"Skill Level": skill_level}
+
+    # Also limit depth for lower ELOs
+    if target_elo < 1600:
+        options["Depth"] = min(10, max(1, target_elo // 200))
+    return options
+
+def configure_engine_elo(engine, target_elo):
+    try:
+        for name, value in get_engine_options(target_elo).items():
+            engine.configure({name: value})
+    except:
+        # If configuration fails, continue with default settings
+        pass
+
+# === Engine Processes ===
+def place_process(pid, cpus=None, nice=0):
+    """Pin a running process and its children (e.g. the engine behind engine_recorder.py)
+    to cpus and lower their priority by nice; affinity is Linux only"""
+    if pid is None:
+        return
+    # Both are per thread on Linux, so every existing thread is placed; threads the
+    # engine starts later inherit them from the thread that starts them
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        tids = [pid]
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                for child in f.read().split():
+                    place_process(int(child), cpus, nice)
+        except OSError:
+            pass
+        try:
+            if cpus and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(tid, cpus)
+            if nice and hasattr(os, "setpriority"):
+                os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + nice)
+        except OSError:
+            pass  # Thread already gone, or not allowed
+
+# === Player Moves ===
+def parse_player_move(board, from_square, to_square):
+    """Build the move for a click from one square to another, or None if it's illegal"""
+    move = chess.Move(from_square, to_square)
+
+    # Check for pawn promotion (always to a queen)
+    piece = board.piece_at(from_square)
+    if piece and piece.piece_type == chess.PAWN:
+        promotion_rank = 7 if piece.color == chess.WHITE else 0
+        if chess.square_rank(to_square) == promotion_rank:
+            move = chess.Move(from_square, to_square, promotion=chess.QUEEN)
+
+    return move if move in board.legal_moves else None
+
+# === Game State ===
+def new_game(player_color=chess.WHITE, elo=1200, thinking_time=0.5):
+    return {
+        "board": chess.Board(),
+        "player_color": player_color,
+        "elo": elo,
+        "thinking_time": thinking_time,
+        "game_over": False,
+        "game_result": "",
+    }
+
+def is_engine_turn(game):
+    return not game["game_over"] and game["board"].turn != game["player_color"]
+
+def apply_move(game, move):
+    """Play a move (human or engine) and update the result; returns what the move did"""
+    board = game["board"]
+    is_capture = board.is_capture(move)
+    board.push(move)
+    update_game_result(game)
+    return {"capture": is_capture, "check": board.is_check(), "game_over": game["game_over"]}
+
+def update_game_result(game):
+    """Mark the game over if the position is terminal; True if it just ended"""
+    if not game["game_over"] and game["board"].is_game_over():
+        game["game_over"] = True
+        game["game_result"] = get_game_result_text(game["board"], game["player_color"])
+        return True
+    return False
+
+def resign(game):
+    game["game_over"] = True
+    game["game_result"] = "You Resigned - Stockfish Won!"
+
+def abort(game, reason):
+    game["game_over"] = True
+    game["game_result"] = reason
+
+# === Snapshots ===
+def game_to_dict(game):
+    board = game["board"]
+    return {
+        "fen": board.root().fen(),
+        "moves": [move.uci() for move in board.move_stack],
+        "player_color": "white" if game["player_color"] == chess.WHITE else "black",
+        "elo": game["elo"],
+        "thinking_time": game["thinking_time"],
+        "game_over": game["game_over"],
+        "game_result": game["game_result"],
+    }
+
+def game_from_dict(data):
+    board = chess.Board(data["fen"])
+    for uci in data["moves"]:
+        board.push_uci(uci)
+    return {
+        "board": board,
+        "player_color": chess.WHITE if data["player_color"] == "white" else chess.BLACK,
+        "elo": data["elo"],
+        "thinking_time": data["thinking_time"],
+        "game_over": data["game_over"],
+        "game_result": data["game_result"],
+    }
@@ -0,0 +1,442 @@
+"""Host many games vs Stockfish over HTTP and WebSocket from one asyncio process.
+
+    python game_server.py --engine /path/to/stockfish --engines 4 --port 8080
+
+HTTP (JSON bodies and responses):
+    POST /games                   {"player_color": "white", "elo": 1200, "thinking_time": 0.5}
+    GET  /games/<id>
+    POST /games/<id>/move         {"move": "e2e4"}  - returns once the engine has replied
+    POST /games/<id>/resign
+    GET  /stats                   sessions per core, engine move latency percentiles
+
+WebSocket:
+    GET  /games/<id>/ws           pushes the game state on every change and
+                                  accepts {"move": "e2e4"} / {"resign": true}
+
+Games live in memory and are written to a JSON snapshot every
+--snapshot-interval seconds (and on shutdown), then restored on startup.
+Engine moves go through the same bounded, fairly scheduled engine pool as
+engine_server.py, with one scheduling queue per game. A failed or timed-out
+engine move is retried and reported in "engine_error"; if it keeps failing the
+game is aborted. Bodies and frames over 64 KB are refused. Finished games are
+dropped after 10 minutes without activity, unfinished ones after 6 hours.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import asyncio
+import hashlib
+import argparse
+from collections import deque
+
+import chess
+
+import game_core
+from engine_server import FairScheduler, engine_worker, MAX_THINK_TIME
+
+DEFAULT_PORT = 8080
+SNAPSHOT_FILE = "game_snapshots.json"
+SNAPSHOT_INTERVAL = 30.0  # Seconds between snapshots
+LATENCY_SAMPLES = 10000  # Most recent engine move latencies kept for /stats
+ENGINE_TIMEOUT = 30.0  # Seconds an engine move may take, queueing included, before it is retried
+ENGINE_ATTEMPTS = 3  # Tries per engine move before the game is aborted
+MAX_MESSAGE_BYTES = 64 * 1024  # Largest HTTP body or WebSocket frame accepted
+FINISHED_SESSION_TTL = 600.0  # Seconds a finished game is kept after its last activity
+IDLE_SESSION_TTL = 6 * 3600.0  # Seconds an unfinished game with no activity is kept
+SESSION_SWEEP_INTERVAL = 60.0  # Seconds between expiry sweeps
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# === Stats ===
+def latency_percentiles(samples, percentiles=(50, 90, 99)):
+    """Nearest-rank percentiles of a list of latencies, in milliseconds"""
+    if not samples:
+        return {f"p{p}": None for p in percentiles}
+    ordered = sorted(samples)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 1)
+            for p in percentiles}
+
+def get_stats(server):
+    now = time.monotonic()
+    cpu_now = time.process_time()
+    elapsed = now - server["stats_since"]
+    cpu_usage = (cpu_now - server["cpu_since"]) / elapsed if elapsed > 0 else 0.0
+    server["stats_since"], server["cpu_since"] = now, cpu_now
+
+    sessions = server["sessions"]
+    active = sum(1 for session in sessions.values() if not session["game"]["game_over"])
+    cores = os.cpu_count() or 1
+    return {
+        "sessions": len(sessions),
+        "active_sessions": active,
+        "cores": cores,
+        "sessions_per_core": round(active / cores, 2),
+        "server_cpu": round(cpu_usage, 3),  # Cores used by this process since the last /stats call
+        "engine_moves": server["engine_moves"],
+        "engine_move_latency_ms": latency_percentiles(server["latencies"]),
+    }
+
+# === Sessions ===
+def new_session(game):
+    return {"id": uuid.uuid4().hex[:12], "game": game, "subscribers": set(),
+            "lock": asyncio.Lock(), "engine_thinking": False, "engine_error": None,
+            "last_active": time.monotonic()}
+
+def session_state(session):
+    state = game_core.game_to_dict(session["game"])
+    board = session["game"]["board"]
+    state.update({
+        "id": session["id"],
+        "board_fen": board.fen(),
+        "turn": "white" if board.turn == chess.WHITE else "black",
+        "engine_thinking": session["engine_thinking"],
+        "engine_error": session["engine_error"],
+    })
+    return state
+
+async def publish(session):
+    session["last_active"] = time.monotonic()
+    message = json.dumps(session_state(session)).encode()
+    for writer in list(session["subscribers"]):
+        try:
+            await write_frame(writer, 0x1, message)
+        except ConnectionError:
+            session["subscribers"].discard(writer)
+
+def engine_request(game):
+    """Engine pool request (engine_server wire format) for the game's current position"""
+    board = game["board"]
+    request = {
+        "fen": board.root().fen(),
+        "moves": [move.uci() for move in board.move_stack],
+        "options": game_core.get_engine_options(game["elo"]),
+        "limit": {"time": game["thinking_time"]},
+    }
+    cheap = game_core.get_cheap_play_profile(game["elo"])
+    if cheap:
+        request["cheap"] = cheap
+        request["limit"] = {"nodes": cheap["nodes"]}
+    return request
+
+async def play_engine_turn(server, session):
+    """Ask the engine pool for a move if it's the engine's turn (caller holds the session lock)"""
+    game = session["game"]
+    if not game_core.is_engine_turn(game):
+        return
+    request = engine_request(game)
+    session["engine_thinking"] = True
+    session["engine_error"] = None
+    await publish(session)
+    move = None
+    for attempt in range(ENGINE_ATTEMPTS):
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        await server["scheduler"].put(session["id"], (request, future))
+        try:
+            response = await asyncio.wait_for(future, ENGINE_TIMEOUT)
+        except asyncio.TimeoutError:  # wait_for cancels the future, so a worker skips it if still queued
+            response = {"error": f"no engine reply within {ENGINE_TIMEOUT:.0f} s"}
+        server["latencies"].append(time.monotonic() - started)
+        server["engine_moves"] += 1
+        try:
+            move = chess.Move.from_uci(response["move"]) if response.get("move") else None
+        except ValueError:
+            response = {"error": f"bad engine move {response['move']!r}"}
+        if move is not None and move in game["board"].legal_moves:
+            break
+        move = None
+        session["engine_error"] = response.get("error") or "engine returned no move"
+        await publish(session)  # Let the client see the failure while the move is retried
+    session["engine_thinking"] = False
+    if move is not None:
+        session["engine_error"] = None
+        game_core.apply_move(game, move)
+    else:
+        # Without a move the game can never continue; end it rather than leave it stuck on the engine's turn
+        game_core.abort(game, "Engine unavailable - Game Aborted")
+    await publish(session)
+
+async def player_move(server, session, uci):
+    """Apply a human move and wait for the engine's reply; returns an error string or None"""
+    async with session["lock"]:
+        game = session["game"]
+        if game["game_over"]:
+            return "game is over"
+        if game["board"].turn != game["player_color"]:
+            return "not your turn"
+        try:
+            move = chess.Move.from_uci(uci)
+        except (ValueError, TypeError):
+            return f"bad move {uci!r}"
+        if not move.promotion:
+            move = game_core.parse_player_move(game["board"], move.from_square, move.to_square)
+        if move is None or move not in game["board"].legal_moves:
+            return f"illegal move {uci!r}"
+        game_core.apply_move(game, move)
+        await publish(session)
+        await play_engine_turn(server, session)
+    return None
+
+async def engine_opening_move(server, session):
+    """Let the engine move first in games where the player took black"""
+    async with session["lock"]:
+        await play_engine_turn(server, session)
+
+async def player_resign(session):
+    async with session["lock"]:
+        game_core.resign(session["game"])
+        await publish(session)
+
+# === Snapshots ===
+def snapshot_data(server):
+    return {session_id: game_core.game_to_dict(session["game"])
+            for session_id, session in server["sessions"].items()}
+
+def write_snapshot(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)  # Never leave a half-written snapshot
+
+def load_snapshot(server):
+    if not os.path.exists(server["snapshot_file"]):
+        return
+    with open(server["snapshot_file"]) as f:
+        data = json.load(f)
+    for session_id, state in data.items():
+        session = new_session(game_core.game_from_dict(state))
+        session["id"] = session_id
+        server["sessions"][session_id] = session
+
+# === Expiry ===
+def expire_sessions(server, now):
+    """Drop finished or idle games nobody is watching; returns how many went"""
+    expired = [session_id for session_id, session in server["sessions"].items()
+               if not session["subscribers"] and not session["engine_thinking"]
+               and now - session["last_active"] > (FINISHED_SESSION_TTL if session["game"]["game_over"] else IDLE_SESSION_TTL)]
+    for session_id in expired:
+        del server["sessions"][session_id]
+    return len(expired)
+
+async def expiry_loop(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        expire_sessions(server, time.monotonic())
+
+async def snapshot_loop(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        # Serialise on the loop (cheap), write the file off it
+        await asyncio.to_thread(write_snapshot, server["snapshot_file"], snapshot_data(server))
+
+# === WebSocket Framing ===
+async def read_frame(reader):
+    """Read one WebSocket frame; returns (opcode, payload), or raises ValueError if it is too large"""
+    header = await reader.readexactly(2)
+    opcode = header[0] & 0x0F
+    masked = header[1] & 0x80
+    length = header[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(await reader.readexactly(2), "big")
+    elif length == 127:
+        length = int.from_bytes(await reader.readexactly(8), "big")
+    if length > MAX_MESSAGE_BYTES:
+        raise ValueError(f"frame of {length} bytes")
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+async def write_frame(writer, opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, length])
+    elif length < 65536:
+        header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+    else:
+        header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+    writer.write(header + payload)
+    await writer.drain()
+
+async def serve_websocket(server, session, headers, reader, writer):
+    accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest())
+    writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+    session["subscribers"].add(writer)
+    try:
+        await write_frame(writer, 0x1, json.dumps(session_state(session)).encode())
+        while True:
+            opcode, payload = await read_frame(reader)
+            if opcode == 0x8:  # Close
+                await write_frame(writer, 0x8, payload[:2])
+                break
+            if opcode == 0x9:  # Ping
+                await write_frame(writer, 0xA, payload)
+                continue
+            if opcode != 0x1:
+                continue
+            try:
+                message = json.loads(payload)
+            except ValueError:
+                message = {}
+            if not isinstance(message, dict):
+                message = {}
+            if message.get("resign"):
+                await player_resign(session)
+            elif "move" in message:
+                error = await player_move(server, session, message["move"])
+                if error:
+                    await write_frame(writer, 0x1, json.dumps({"error": error}).encode())
+    except ValueError:  # Oversized frame: close with 1009 (message too big)
+        try:
+            await write_frame(writer, 0x8, (1009).to_bytes(2, "big"))
+        except ConnectionError:
+            pass
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        session["subscribers"].discard(writer)
+
+# === HTTP ===
+async def route(server, method, path, body):
+    """Handle one HTTP request; returns (status, response dict)"""
+    parts = [part for part in path.split("?")[0].split("/") if part]
+    sessions = server["sessions"]
+
+    if method == "GET" and parts == ["stats"]:
+        return 200, get_stats(server)
+
+    if method == "POST" and parts == ["games"]:
+        player_color = chess.BLACK if body.get("player_color") == "black" else chess.WHITE
+        thinking_time = min(float(body.get("thinking_time", 0.5)), server["max_time"])
+        if not thinking_time > 0:
+            raise ValueError("thinking_time must be positive")
+        session = new_session(game_core.new_game(player_color, int(body.get("elo", 1200)), thinking_time))
+        sessions[session["id"]] = session
+        asyncio.create_task(engine_opening_move(server, session))
+        return 201, session_state(session)
+
+    if len(parts) >= 2 and parts[0] == "games":
+        session = sessions.get(parts[1])
+        if session is None:
+            return 404, {"error": "no such game"}
+        session["last_active"] = time.monotonic()
+        if method == "GET" and len(parts) == 2:
+            return 200, session_state(session)
+        if method == "POST" and parts[2:] == ["move"]:
+            error = await player_move(server, session, body.get("move"))
+            return (400, {"error": error}) if error else (200, session_state(session))
+        if method == "POST" and parts[2:] == ["resign"]:
+            await player_resign(session)
+            return 200, session_state(session)
+        if method == "DELETE" and len(parts) == 2:
+            del sessions[parts[1]]
+            return 200, {"deleted": parts[1]}
+
+    return 404, {"error": "not found"}
+
+async def write_response(writer, status, response):
+    payload = json.dumps(response).encode()
+    writer.write(f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+
+async def handle_connection(server, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            parts = [part for part in path.split("/") if part]
+            if headers.get("upgrade", "").lower() == "websocket" and len(parts) == 3 and parts[2] == "ws":
+                session = server["sessions"].get(parts[1])
+                if session is None:
+                    await write_response(writer, 404, {"error": "no such game"})
+                elif "sec-websocket-key" not in headers:
+                    await write_response(writer, 400, {"error": "missing Sec-WebSocket-Key"})
+                else:
+                    await serve_websocket(server, session, headers, reader, writer)
+                break
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_MESSAGE_BYTES:
+                status, response = 413, {"error": f"body over {MAX_MESSAGE_BYTES} bytes"}
+                headers["connection"] = "close"  # The unread body is still on the socket
+            else:
+                body = await reader.readexactly(length)
+                try:
+                    data = json.loads(body) if body else {}
+                    if not isinstance(data, dict):
+                        raise ValueError("body must be a JSON object")
+                    status, response = await route(server, method, path, data)
+                except (ValueError, TypeError) as e:
+                    status, response = 400, {"error": str(e)}
+            await write_response(writer, status, response)
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(engine_command, engines, host, port, snapshot_file, snapshot_interval, max_time):
+    server = {
+        "sessions": {},
+        "scheduler": FairScheduler(),
+        "latencies": deque(maxlen=LATENCY_SAMPLES),
+        "engine_moves": 0,
+        "snapshot_file": snapshot_file,
+        "max_time": max_time,
+        "stats_since": time.monotonic(),
+        "cpu_since": time.process_time(),
+    }
+    load_snapshot(server)
+    tasks = [asyncio.create_task(engine_worker(engine_command, server["scheduler"], max_time)) for _ in range(engines)]
+    tasks.append(asyncio.create_task(snapshot_loop(server, snapshot_interval)))
+    tasks.append(asyncio.create_task(expiry_loop(server, SESSION_SWEEP_INTERVAL)))
+    # Restored games where the engine was on move carry on
+    for session in server["sessions"].values():
+        asyncio.create_task(engine_opening_move(server, session))
+
+    tcp_server = await asyncio.start_server(lambda r, w: handle_connection(server, r, w), host, port)
+    print(f"Game server on http://{host}:{port} with {engines} engine(s), {len(server['sessions'])} restored game(s)")
+    async with tcp_server:
+        try:
+            await tcp_server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            write_snapshot(server["snapshot_file"], snapshot_data(server))
+
+# === Command Line ===
+def main():
+    parser = argparse.ArgumentParser(description="Serve games vs Stockfish over HTTP/WebSocket")
+    parser.add_argument("--engine", required=True, help="path to the Stockfish binary")
+    parser.add_argument("--engines", type=int, default=2, help="engine processes in the pool (default: 2)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--snapshot-file", default=SNAPSHOT_FILE)
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL)
+    parser.add_argument("--max-time", type=float, default=MAX_THINK_TIME,
+                        help=f"longest engine search per move, in seconds (default: {MAX_THINK_TIME})")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.engine, args.engines, args.host, args.port,
+                          args.snapshot_file, args.snapshot_interval, args.max_time))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
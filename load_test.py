@@ -0,0 +1,328 @@
+"""Load test: how many simultaneous games can one host serve?
+
+Simulates N headless game sessions (the same game_core flow the GUI and
+game_server.py use), each with a simulated human who thinks for a while and
+then plays a random legal move or the next move of a scripted game. Engine
+moves go through engine_server's worker/scheduler code, either one engine per
+session (--mode own, like a GUI each running its own Stockfish) or a pool
+shared by all sessions (--mode shared, like game_server.py).
+
+N is ramped up in steps. For each step the report gives engine move latency
+percentiles (queueing included, as a player would see it), overall and per
+ELO preset, engine moves per second and host CPU use. The knee is the last
+step before latency blows up or the CPU saturates, which is the number of
+sessions to size one host for.
+
+    python load_test.py --engine /path/to/stockfish --steps 1,2,4,8,16,32
+    python load_test.py --engine stockfish --mode shared --engines 4 --elo-mix 800:3,1200:2,2000:1
+    python load_test.py --engine stockfish --think exp:5 --script games.pgn --json load.json
+
+Think times (seconds per human move):
+    fixed:2   uniform:1:10   exp:5   lognormal:1.5:0.8   (mu and sigma of ln seconds)
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import chess
+import chess.pgn
+import chess.engine
+
+import game_core
+from engine_server import FairScheduler, engine_worker, MAX_THINK_TIME
+from game_server import engine_request, latency_percentiles
+
+DEFAULT_STEPS = "1,2,4,8,16"
+STEP_DURATION = 30.0  # Seconds measured per step
+WARMUP = 5.0  # Seconds after adding sessions before a step's measurements start
+DEFAULT_THINK = "exp:5"
+DEFAULT_ELO_MIX = "1200:1"
+RESTART_PAUSE = 1.0  # Seconds between one finished game and the session's next
+PERCENTILES = (50, 90, 99)
+KNEE_LATENCY_FACTOR = 2.0  # Past the knee once p90 is this many times the first step's
+SATURATED_CPU = 0.9  # ...or host CPU use passes this fraction of all cores
+
+# === Simulated Players ===
+def parse_think_time(spec):
+    """'exp:5' etc. -> function(rng) returning a think time in seconds"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(":") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1 and values[0] > 0:
+        return lambda rng: rng.expovariate(1 / values[0])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"bad think time {spec!r} (fixed:S, uniform:A:B, exp:MEAN or lognormal:MU:SIGMA)")
+
+def parse_elo_mix(spec):
+    """'800:3,1200:1' -> ([800, 1200], [3.0, 1.0]); a bare ELO has weight 1"""
+    elos, weights = [], []
+    for item in filter(None, spec.split(",")):
+        elo, _, weight = item.partition(":")
+        elos.append(int(elo))
+        weights.append(float(weight or 1))
+    if not elos or min(weights) < 0 or not sum(weights):
+        raise ValueError(f"bad ELO mix {spec!r}")
+    return elos, weights
+
+def read_scripts(path):
+    """Main lines of a PGN file as lists of moves, for scripted players"""
+    scripts = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            moves = list(game.mainline_moves())
+            if moves:
+                scripts.append(moves)
+    return scripts
+
+def pick_player_move(board, script, rng):
+    """The script's next move while the game still follows it, otherwise a random legal move"""
+    ply = len(board.move_stack)
+    if script and ply < len(script) and board.move_stack == script[:ply] and script[ply] in board.legal_moves:
+        return script[ply]
+    return rng.choice(list(board.legal_moves))
+
+# === Sessions ===
+async def request_engine_move(test, scheduler, session_id, game):
+    """One engine move through the scheduler, recording its latency; returns the move or None"""
+    future = asyncio.get_running_loop().create_future()
+    started = time.monotonic()
+    await scheduler.put(session_id, (engine_request(game), future))
+    response = await future
+    step = test["step"]
+    latency = time.monotonic() - started
+    if step is not None and started >= step["measure_from"]:
+        step["latencies"].append(latency)
+        step["by_elo"].setdefault(game["elo"], []).append(latency)
+        if response.get("error"):
+            step["errors"] += 1
+    return chess.Move.from_uci(response["move"]) if response.get("move") else None
+
+async def run_session(test, session_id, scheduler, elo, rng):
+    """Play games back to back until the test stops"""
+    while True:
+        game = game_core.new_game(rng.choice([chess.WHITE, chess.BLACK]), elo, test["thinking_time"])
+        script = rng.choice(test["scripts"]) if test["scripts"] else None
+        while not game["game_over"]:
+            if game_core.is_engine_turn(game):
+                move = await request_engine_move(test, scheduler, session_id, game)
+                if move is None:
+                    game_core.resign(game)  # Engine failed; start over rather than spin
+                    break
+            else:
+                await asyncio.sleep(test["think_time"](rng))
+                move = pick_player_move(game["board"], script, rng)
+            game_core.apply_move(game, move)
+        test["games"] += 1
+        await asyncio.sleep(RESTART_PAUSE)
+
+# === CPU ===
+def read_cpu_times():
+    """(busy, total) jiffies for the whole host, or None if unavailable"""
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(value) for value in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        pass
+    else:
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+        total = sum(fields[:8])  # guest time is already counted in user
+        return total - idle, total
+    try:
+        import psutil
+    except ImportError:
+        return None
+    times = psutil.cpu_times()
+    idle = times.idle + getattr(times, "iowait", 0.0)
+    total = sum(times)
+    return total - idle, total
+
+def cpu_usage(before, after):
+    """Busy fraction of all cores between two read_cpu_times() samples"""
+    if before is None or after is None or after[1] <= before[1]:
+        return None
+    return (after[0] - before[0]) / (after[1] - before[1])
+
+# === Ramp ===
+async def start_engines(engine_command, count):
+    """Start engines up front, so their startup isn't part of any measured move"""
+    started = await asyncio.gather(*(chess.engine.popen_uci(engine_command) for _ in range(count)),
+                                   return_exceptions=True)
+    engines = [result[1] for result in started if not isinstance(result, BaseException)]
+    errors = [result for result in started if isinstance(result, BaseException)]
+    if errors:
+        await asyncio.gather(*(engine.quit() for engine in engines), return_exceptions=True)
+        raise errors[0]
+    return engines
+
+def summarize_step(step, sessions, elapsed, cpu, harness_cpu):
+    return {
+        "sessions": sessions,
+        "engine_moves": len(step["latencies"]),
+        "moves_per_second": round(len(step["latencies"]) / elapsed, 2) if elapsed > 0 else 0.0,
+        "errors": step["errors"],
+        "latency_ms": latency_percentiles(step["latencies"], PERCENTILES),
+        "latency_ms_by_elo": {str(elo): latency_percentiles(samples, PERCENTILES)
+                              for elo, samples in sorted(step["by_elo"].items())},
+        "host_cpu": None if cpu is None else round(cpu, 3),
+        "harness_cpu": round(harness_cpu, 3),  # Cores used by this process (the simulated players)
+    }
+
+def find_knee(results, latency_factor=KNEE_LATENCY_FACTOR, saturated_cpu=SATURATED_CPU):
+    """Index of the last step before p90 latency passes latency_factor x the first step's
+    or the host CPU saturates; None if even the first step is past it"""
+    baseline = next((result["latency_ms"]["p90"] for result in results if result["latency_ms"]["p90"]), None)
+    knee = None
+    for index, result in enumerate(results):
+        p90 = result["latency_ms"]["p90"]
+        if p90 is None:
+            continue  # No engine moves measured (think times longer than the step)
+        saturated = result["host_cpu"] is not None and result["host_cpu"] >= saturated_cpu
+        if p90 > baseline * latency_factor or saturated or result["errors"]:
+            break
+        knee = index
+    return knee
+
+async def run_load_test(engine_command, steps, mode="own", engines=2, elo_mix=([1200], [1.0]),
+                        think_time=DEFAULT_THINK, thinking_time=0.5, scripts=(), step_duration=STEP_DURATION,
+                        warmup=WARMUP, max_time=MAX_THINK_TIME, seed=None, report=print):
+    """Ramp through the session counts in steps; returns one summary dict per step"""
+    rng = random.Random(seed)
+    test = {
+        "think_time": parse_think_time(think_time),
+        "thinking_time": thinking_time,
+        "scripts": list(scripts),
+        "step": None,
+        "games": 0,
+    }
+    tasks = []  # Workers quit their engines when cancelled
+    shared = None
+    if mode == "shared":
+        shared = FairScheduler()
+        tasks += [asyncio.create_task(engine_worker(engine_command, shared, max_time, engine))
+                  for engine in await start_engines(engine_command, engines)]
+
+    results = []
+    sessions = 0
+    try:
+        for target in steps:
+            new_engines = await start_engines(engine_command, target - sessions) if shared is None else []
+            while sessions < target:
+                sessions += 1
+                scheduler = shared
+                if scheduler is None:  # Own engine: a private scheduler with a single worker
+                    scheduler = FairScheduler()
+                    tasks.append(asyncio.create_task(engine_worker(engine_command, scheduler, max_time,
+                                                                   new_engines.pop())))
+                elo = rng.choices(*elo_mix)[0]
+                session_rng = random.Random(rng.random())
+                tasks.append(asyncio.create_task(run_session(test, f"s{sessions}", scheduler, elo, session_rng)))
+
+            step = {"latencies": [], "by_elo": {}, "errors": 0, "measure_from": time.monotonic() + warmup}
+            test["step"] = step
+            await asyncio.sleep(warmup)
+            cpu_before, harness_before = read_cpu_times(), time.process_time()
+            started = time.monotonic()
+            await asyncio.sleep(step_duration)
+            elapsed = time.monotonic() - started
+            result = summarize_step(step, sessions, elapsed, cpu_usage(cpu_before, read_cpu_times()),
+                                    (time.process_time() - harness_before) / elapsed)
+            results.append(result)
+            report(format_step(result))
+    finally:
+        test["step"] = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+# === Report ===
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+def format_step(result):
+    latency = result["latency_ms"]
+    cpu = "-" if result["host_cpu"] is None else f"{result['host_cpu']:.0%}"
+    line = (f"{result['sessions']:>5} sessions  {result['moves_per_second']:>7.1f} moves/s  "
+            f"p50 {format_ms(latency['p50']):>6}  p90 {format_ms(latency['p90']):>6}  "
+            f"p99 {format_ms(latency['p99']):>6} ms  cpu {cpu:>4}")
+    if result["errors"]:
+        line += f"  {result['errors']} errors"
+    by_elo = result["latency_ms_by_elo"]
+    if len(by_elo) > 1:
+        line += "  (" + ", ".join(f"{elo}: p90 {format_ms(p['p90'])}" for elo, p in by_elo.items()) + ")"
+    return line
+
+def format_knee(results, knee):
+    cores = os.cpu_count() or 1
+    if not results:
+        return "No steps were run"
+    if knee is None:
+        return "Past the knee already at the first step; try fewer sessions or longer think times"
+    result = results[knee]
+    text = (f"Knee: {result['sessions']} sessions ({result['sessions'] / cores:.1f} per core, "
+            f"p90 {format_ms(result['latency_ms']['p90'])} ms)")
+    if knee + 1 < len(results):
+        after = results[knee + 1]
+        text += (f"; at {after['sessions']} p90 is {format_ms(after['latency_ms']['p90'])} ms"
+                 + ("" if after["host_cpu"] is None else f" with cpu at {after['host_cpu']:.0%}"))
+    else:
+        text += "; not reached, ramp further"
+    return text
+
+# === Command Line ===
+def main():
+    parser = argparse.ArgumentParser(description="Ramp simulated game sessions against Stockfish and find the knee")
+    parser.add_argument("--engine", required=True, help="path to the Stockfish binary")
+    parser.add_argument("--mode", choices=("own", "shared"), default="own",
+                        help="one engine per session, or a shared pool as in game_server.py (default: own)")
+    parser.add_argument("--engines", type=int, default=os.cpu_count() or 1,
+                        help="shared mode: engine processes in the pool (default: one per core)")
+    parser.add_argument("--steps", default=DEFAULT_STEPS, help=f"session counts to ramp through (default: {DEFAULT_STEPS})")
+    parser.add_argument("--step-duration", type=float, default=STEP_DURATION, help="seconds measured per step")
+    parser.add_argument("--warmup", type=float, default=WARMUP, help="seconds before each step is measured")
+    parser.add_argument("--think", default=DEFAULT_THINK, help=f"human think time distribution (default: {DEFAULT_THINK})")
+    parser.add_argument("--elo-mix", default=DEFAULT_ELO_MIX, help="ELO presets and weights, e.g. 800:3,1200:2,2000:1")
+    parser.add_argument("--thinking-time", type=float, default=0.5, help="engine time per move for full-strength presets")
+    parser.add_argument("--script", help="PGN file whose games the simulated players follow (random moves otherwise)")
+    parser.add_argument("--max-time", type=float, default=MAX_THINK_TIME)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="also write the per-step results and the knee to this file")
+    args = parser.parse_args()
+
+    try:
+        steps = sorted({int(value) for value in args.steps.split(",") if value})
+        elo_mix = parse_elo_mix(args.elo_mix)
+        parse_think_time(args.think)
+    except ValueError as e:
+        parser.error(str(e))
+    scripts = read_scripts(args.script) if args.script else []
+
+    print(f"Ramping {','.join(map(str, steps))} sessions, {args.mode} engine(s)"
+          + (f" x{args.engines}" if args.mode == "shared" else "")
+          + f", think {args.think}, ELO mix {args.elo_mix}, {os.cpu_count() or 1} core(s)")
+    try:
+        results = asyncio.run(run_load_test(
+            args.engine, steps, args.mode, args.engines, elo_mix, args.think, args.thinking_time, scripts,
+            args.step_duration, args.warmup, args.max_time, args.seed))
+    except KeyboardInterrupt:
+        return 1
+    knee = find_knee(results)
+    print(format_knee(results, knee))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"steps": results, "knee": None if knee is None else results[knee]["sessions"]}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""Memory budget for long-running sessions (kiosks left on for days).
+
+One budget (CHESS_MEMORY_BUDGET_MB) is split between the GUI process and
+the engine processes. The GUI's part covers its sprite and text surface caches
+plus the interpreter, SDL and the window. The engines' part covers the game
+engine's Hash, the review engine's (reserved up front) and the engines' own
+memory. Every few seconds a sampler reads the GUI's RSS (plus tracemalloc
+when tracing is on) and the engine processes' RSS by pid. Each side is checked
+against its own share, and only the side that is over it shrinks. The GUI
+trims its caches (unless they are already trimmed, when it just warns once);
+the engine gets its Hash halved, once the previous resize has been applied.
+
+Surface caches are plain LRU dicts limited by bytes:
+    cache = new_surface_cache(4 * 1024 * 1024)
+    surface = cache_get(cache, key) or cache_put(cache, key, font.render(...))
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+BUDGET_SHARES = {"sprites": 0.15, "text": 0.05, "engine": 0.40}  # The GUI gets everything but "engine"
+SAMPLE_INTERVAL_MS = 5000
+TRIM_THRESHOLD = 0.9  # Shrink once a side's RSS passes this fraction of its share
+TRIM_TO = 0.5  # Caches keep this fraction of their limit after a trim
+MIN_ENGINE_HASH_MB = 16
+ENGINE_BASE_MB = 64  # Stockfish's memory besides Hash (network, threads), for the starting Hash size
+TOP_ALLOCATIONS = 3  # Allocation sites listed in the debug panel
+
+# === Surface Caches ===
+def new_surface_cache(limit_bytes):
+    return {"entries": {}, "bytes": 0, "limit": limit_bytes, "hits": 0, "misses": 0}
+
+def surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+def cache_get(cache, key):
+    """Cached surface for key (marked most recently used), or None"""
+    entries = cache["entries"]
+    surface = entries.pop(key, None)
+    if surface is None:
+        cache["misses"] += 1
+        return None
+    entries[key] = surface  # Re-insert at the end: dicts keep insertion order
+    cache["hits"] += 1
+    return surface
+
+def cache_put(cache, key, surface):
+    """Store a surface, evicting the least recently used ones beyond the limit; returns it"""
+    old = cache["entries"].pop(key, None)
+    if old is not None:
+        cache["bytes"] -= surface_bytes(old)
+    cache["entries"][key] = surface
+    cache["bytes"] += surface_bytes(surface)
+    trim_cache(cache, cache["limit"])
+    return surface
+
+def trim_cache(cache, limit_bytes):
+    entries = cache["entries"]
+    while entries and cache["bytes"] > limit_bytes:
+        cache["bytes"] -= surface_bytes(entries.pop(next(iter(entries))))
+
+# === Sampling ===
+def read_rss(pid=None):
+    """Resident set size in bytes of this process (or pid), or None if it can't be read"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:  # ImportError, or the process has exited
+        return None
+
+def read_engine_rss(pids):
+    """Total RSS of the engine processes that could be read, or None if none could"""
+    sizes = [size for size in map(read_rss, filter(None, pids)) if size is not None]
+    return sum(sizes) if sizes else None
+
+def release_freed_memory():
+    """Hand freed heap pages back to the OS (glibc keeps them otherwise)"""
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+def new_memory_budget(budget_mb, caches, trace=False, reserved_engine_mb=0):
+    """Budget state; budget_mb of 0 only samples (for the debug panel) and never trims.
+    reserved_engine_mb is engine memory outside the game engine's Hash (e.g. the review engine's)"""
+    budget_bytes = int(budget_mb * 1024 * 1024)
+    engine_mb = budget_mb * BUDGET_SHARES["engine"]
+    budget = {
+        "budget_bytes": budget_bytes,
+        "gui_limit": budget_bytes - int(engine_mb * 1024 * 1024),
+        "engine_limit": int(engine_mb * 1024 * 1024),
+        "caches": caches,  # "sprites" / "text" -> surface cache
+        "engine_hash_mb": None,  # Hash the game engine should have; chess_game applies it between searches
+        "engine_hash_applied_mb": None,  # Hash the game engine has now
+        "rss": None,
+        "engine_rss": None,
+        "traced": None,  # (current, peak) bytes when tracemalloc is on
+        "top": [],  # (location, bytes) of the largest allocation sites
+        "trims": 0,
+        "hash_cuts": 0,
+        "gui_floor_warned": False,  # GUI over its share with nothing left to trim
+        "sampled": 0.0,
+    }
+    for name, cache in caches.items():
+        if budget_mb:
+            cache["limit"] = int(budget_bytes * BUDGET_SHARES[name])
+    if budget_mb:
+        budget["engine_hash_mb"] = max(MIN_ENGINE_HASH_MB, int(engine_mb - reserved_engine_mb - ENGINE_BASE_MB))
+    set_memory_tracing(budget, trace)
+    return budget
+
+def set_memory_tracing(budget, enabled):
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        budget["traced"] = None
+        budget["top"] = []
+
+def sample_memory(budget, engine_pids=()):
+    """Take a sample and shrink whichever side is over its share; returns True if caches were trimmed"""
+    budget["rss"] = read_rss()
+    budget["engine_rss"] = read_engine_rss(engine_pids)
+    budget["sampled"] = time.monotonic()
+    if tracemalloc.is_tracing():
+        budget["traced"] = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        stats = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        budget["top"] = [(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size)
+                         for stat in stats]
+
+    # Engines: halving Hash is the only lever, and a pending resize has to land before it shows in RSS
+    hash_mb = budget["engine_hash_mb"]
+    if (budget["engine_limit"] and budget["engine_rss"] is not None
+            and budget["engine_rss"] >= budget["engine_limit"] * TRIM_THRESHOLD
+            and hash_mb is not None and hash_mb > MIN_ENGINE_HASH_MB and budget["engine_hash_applied_mb"] == hash_mb):
+        budget["engine_hash_mb"] = max(MIN_ENGINE_HASH_MB, hash_mb // 2)
+        budget["hash_cuts"] += 1
+
+    # GUI: the caches are what this process can give back
+    limit = budget["gui_limit"]
+    if not budget["budget_bytes"] or budget["rss"] is None or budget["rss"] < limit * TRIM_THRESHOLD:
+        return False
+    if all(cache["bytes"] <= cache["limit"] * TRIM_TO for cache in budget["caches"].values()):
+        # Already trimmed: the rest is the interpreter, SDL and the window, so trimming again would only churn
+        if not budget["gui_floor_warned"]:
+            print(f"Memory budget: the GUI uses {budget['rss'] / (1024 * 1024):.0f} MB with its caches trimmed, "
+                  f"over its {limit / (1024 * 1024):.0f} MB share; raise CHESS_MEMORY_BUDGET_MB")
+            budget["gui_floor_warned"] = True
+        return False
+    for cache in budget["caches"].values():
+        trim_cache(cache, int(cache["limit"] * TRIM_TO))
+    release_freed_memory()
+    budget["trims"] += 1
+    return True
+
+def get_memory_lines(budget):
+    """Debug panel text"""
+    mb = 1024 * 1024
+    rss = "?" if budget["rss"] is None else f"{budget['rss'] / mb:.1f}"
+    lines = [f"RSS {rss} MB" + (f" / {budget['gui_limit'] / mb:.0f} MB" if budget["budget_bytes"] else "")]
+    if budget["engine_rss"] is not None:
+        lines.append(f"Engines RSS {budget['engine_rss'] / mb:.1f} MB"
+                     + (f" / {budget['engine_limit'] / mb:.0f} MB" if budget["budget_bytes"] else ""))
+    if budget["traced"]:
+        current, peak = budget["traced"]
+        lines.append(f"Python heap {current / mb:.1f} MB (peak {peak / mb:.1f})")
+    for name, cache in budget["caches"].items():
+        lines.append(f"{name.capitalize()} cache {cache['bytes'] / mb:.1f}/{cache['limit'] / mb:.1f} MB, "
+                     f"{len(cache['entries'])} surfaces")
+    if budget["engine_hash_mb"] is not None:
+        lines.append(f"Engine hash {budget['engine_hash_mb']} MB (halved {budget['hash_cuts']}x)")
+    lines.append(f"Trims {budget['trims']}")
+    for location, size in budget["top"]:
+        lines.append(f"  {location} {size / 1024:.0f} KB")
+    return lines
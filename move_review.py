@@ -0,0 +1,201 @@
+"""Review the player's moves in the background while the game is being played.
+
+A second, single-threaded Stockfish at low OS priority analyses each human
+move as soon as it's made: once for the best line from the position before
+the move, once restricted to the move that was played. The difference in
+expected score (win + draw/2) classifies the move. Analysis is throttled to
+a fraction of one core (the CPU budget) so it only uses idle time, and the
+throttle is lifted when the game ends so the last moves finish at once.
+
+Expected scores come from the engine's WDL output (UCI_ShowWDL). If the
+engine doesn't report WDL, the same win-rate model as Stockfish's uci.cpp
+(win_rate_params / win_rate_model) is applied to the centipawn score.
+"""
+import os
+import math
+import time
+import queue
+import threading
+
+import chess
+import chess.engine
+
+from game_core import place_process
+
+REVIEW_CPU_BUDGET = 0.25  # Fraction of one core the reviewer may use
+REVIEW_TIME_PER_POSITION = 0.3  # Seconds of analysis per searched position
+REVIEW_NICE = 10  # OS priority increment for the review engine (POSIX)
+REVIEW_HASH_MB = 16
+
+# Expected-score loss thresholds (0-1 scale), checked from the top
+MOVE_CLASSES = [
+    (0.20, "blunder"),
+    (0.10, "mistake"),
+    (0.05, "inaccuracy"),
+    (0.01, "good"),
+]
+
+# === WDL Model (mirrors stockfish/src/uci.cpp) ===
+WIN_RATE_AS = [-13.50030198, 40.92780883, -36.82753545, 386.83004070]
+WIN_RATE_BS = [96.53354896, -165.79058388, 90.89679019, 49.29561889]
+
+def win_rate_params(board):
+    material = (chess.popcount(board.pawns) + 3 * chess.popcount(board.knights)
+                + 3 * chess.popcount(board.bishops) + 5 * chess.popcount(board.rooks)
+                + 9 * chess.popcount(board.queens))
+
+    # The fitted model only uses data for material counts in [17, 78], and is anchored at count 58
+    m = min(max(material, 17), 78) / 58.0
+    as_, bs = WIN_RATE_AS, WIN_RATE_BS
+    a = (((as_[0] * m + as_[1]) * m + as_[2]) * m) + as_[3]
+    b = (((bs[0] * m + bs[1]) * m + bs[2]) * m) + bs[3]
+    return a, b
+
+def expected_score_from_cp(cp, board):
+    """Expected score for the side whose POV cp is given, via the win-rate model"""
+    a, b = win_rate_params(board)
+    value = cp * a / 100  # UCI centipawns are internal units normalised by a
+    win = 1 / (1 + math.exp(min(700.0, (a - value) / b)))
+    loss = 1 / (1 + math.exp(min(700.0, (a + value) / b)))
+    return win + (1 - win - loss) / 2
+
+def expected_score(info, board, color):
+    """Expected score for color from an analysis result"""
+    if "wdl" in info:
+        return info["wdl"].pov(color).expectation()
+    score = info["score"].pov(color)
+    if score.is_mate():
+        return 1.0 if score.mate() > 0 else 0.0
+    return expected_score_from_cp(score.score(), board)
+
+def classify_move(loss, is_best):
+    if is_best:
+        return "best"
+    for threshold, label in MOVE_CLASSES:
+        if loss >= threshold:
+            return label
+    return "best"
+
+# === Review Engine ===
+def open_review_engine(engine_command, cpus=None):
+    engine = chess.engine.SimpleEngine.popen_uci(engine_command)
+    # Same cores as the game engine, off the UI's; placed after the spawn, since
+    # preexec_fn isn't safe from a threaded process
+    place_process(engine.protocol.transport.get_pid(), cpus, REVIEW_NICE)
+    options = {"Threads": 1, "Hash": REVIEW_HASH_MB, "UCI_ShowWDL": True}
+    engine.configure({name: value for name, value in options.items() if name in engine.options})
+    return engine
+
+def review_position(engine, board, move, time_per_position):
+    """Classify one move; board is the position before it"""
+    color = board.turn
+    limit = chess.engine.Limit(time=time_per_position)
+    best = engine.analyse(board, limit)
+    best_move = best["pv"][0] if best.get("pv") else None
+    best_score = expected_score(best, board, color)
+
+    if move == best_move:
+        played_score = best_score
+    else:
+        played = engine.analyse(board, limit, root_moves=[move])
+        played_score = expected_score(played, board, color)
+
+    loss = max(0.0, best_score - played_score)
+    cp_best = best["score"].pov(color).score(mate_score=10000)
+    return {
+        "move": move.uci(),
+        "san": board.san(move),
+        "best_move": best_move.uci() if best_move else None,
+        "loss": round(loss, 3),
+        "cp": cp_best,
+        "class": classify_move(loss, move == best_move),
+    }
+
+def review_worker(review):
+    engine = None
+    while True:
+        job = review["queue"].get()
+        if job is None:
+            break
+        generation, ply, board, move = job
+        if generation != review["generation"]:
+            continue  # Queued before a new game was started (pending was reset then)
+        try:
+            if engine is None:
+                engine = open_review_engine(review["engine_command"], review["cpus"])
+                review["engine_pid"] = engine.protocol.transport.get_pid()  # For the memory budget
+            started = time.monotonic()
+            result = review_position(engine, board, move, review["time_per_position"])
+            spent = time.monotonic() - started
+        except Exception as e:  # Missing binary, crashed engine... the review is off for the session
+            print(f"Move review stopped: {e}")
+            with review["lock"]:
+                review["stopped"] = str(e) or type(e).__name__
+                review["pending"] = 0
+            break
+        with review["lock"]:
+            if generation == review["generation"]:
+                review["results"][ply] = result
+                review["pending"] -= 1
+
+        # Stay within the CPU budget unless the game is over and the review is wanted now
+        if not review["finishing"].is_set():
+            review["finishing"].wait(spent * (1 / review["cpu_budget"] - 1))
+    if engine is not None:
+        engine.quit()
+
+# === Public API ===
+def start_move_review(engine_command, cpu_budget=REVIEW_CPU_BUDGET, time_per_position=REVIEW_TIME_PER_POSITION, cpus=None):
+    review = {
+        "engine_command": engine_command,
+        "cpus": cpus,  # Affinity for the review engine (None: unrestricted)
+        "cpu_budget": cpu_budget,
+        "time_per_position": time_per_position,
+        "queue": queue.Queue(),
+        "results": {},  # ply -> review of that move
+        "pending": 0,  # Moves queued or being analysed
+        "generation": 0,
+        "engine_pid": None,  # Once the review engine is running
+        "stopped": None,  # Why the worker gave up, once it has
+        "lock": threading.Lock(),
+        "finishing": threading.Event(),
+    }
+    review["thread"] = threading.Thread(target=review_worker, args=(review,), daemon=True)
+    review["thread"].start()
+    return review
+
+def review_move(review, board, move):
+    """Queue the move about to be played from board (call before pushing it)"""
+    with review["lock"]:
+        if review["stopped"]:
+            return  # Nothing is left to consume the queue
+        review["pending"] += 1
+    review["queue"].put((review["generation"], len(board.move_stack), board.copy(stack=False), move))
+
+def finish_move_review(review):
+    """Drop the CPU throttle so the remaining moves are reviewed straight away"""
+    review["finishing"].set()
+
+def reset_move_review(review):
+    with review["lock"]:
+        review["generation"] += 1
+        review["results"] = {}
+        review["pending"] = 0
+    review["finishing"].clear()
+
+def get_review_summary(review):
+    """Counts per class for the moves reviewed so far, how many are still pending,
+    and why the review stopped (None while it is working)"""
+    with review["lock"]:
+        results = list(review["results"].values())
+        pending = review["pending"]
+        stopped = review["stopped"]
+    counts = {label: 0 for label in ["best", "good", "inaccuracy", "mistake", "blunder"]}
+    for result in results:
+        counts[result["class"]] += 1
+    return counts, pending, stopped
+
+def stop_move_review(review):
+    review["queue"].put(None)
+    review["finishing"].set()
+    review["thread"].join(timeout=5)
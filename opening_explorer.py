@@ -0,0 +1,295 @@
+"""Opening explorer: which moves were played from a position, and how they scored.
+
+Build the index from PGN archives (plain files are split into chunks and
+parsed on all cores; .gz/.bz2 are streamed by a single worker):
+    python opening_explorer.py index openings.db games/*.pgn --jobs 8 --max-plies 30
+    python opening_explorer.py lookup openings.db e2e4 c7c5
+
+Each position is keyed by its Polyglot Zobrist hash. Workers aggregate
+(hash, move) -> white wins / draws / black wins for their chunk and write
+sorted runs to temp files, which are then merged in one streaming pass.
+The result is memory-mapped at runtime:
+
+    header   MAGIC, version, entry count
+    hashes   uint64 per entry, ascending (bisected directly on the mapping)
+    stats    per entry: uint16 move, 2 pad bytes, uint32 white wins, draws, black wins
+"""
+import io
+import os
+import sys
+import bz2
+import gzip
+import mmap
+import heapq
+import bisect
+import struct
+import argparse
+import tempfile
+from multiprocessing import Pool
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+MAGIC = b"CHOX"
+VERSION = 1
+HEADER_FORMAT = "<4sHxxQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+STATS_FORMAT = "<H2xIII"
+STATS_SIZE = struct.calcsize(STATS_FORMAT)
+RUN_FORMAT = "<QH2xIII"  # Temp run record: hash + stats
+RUN_SIZE = struct.calcsize(RUN_FORMAT)
+MAX_PLIES = 30  # Only the opening phase is indexed
+CHUNK_SIZE = 32 * 1024 * 1024  # Bytes of PGN per worker task
+MAX_RUN_ENTRIES = 2000000  # Flush a sorted run once a worker holds this many (hash, move) pairs
+RESULTS = {"1-0": 0, "1/2-1/2": 1, "0-1": 2}
+
+# === Move Encoding ===
+def encode_move(move):
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+def decode_move(value):
+    return chess.Move(value & 0x3F, (value >> 6) & 0x3F, (value >> 12) or None)
+
+# === Indexing ===
+LABEL_TAGS = ("Event", "Round", "White", "Black")  # Enough to find a skipped game in the file
+
+def game_label(tags):
+    return " / ".join(tags[name] for name in LABEL_TAGS if tags.get(name, "?") != "?") or "untitled game"
+
+class PositionVisitor(chess.pgn.BaseVisitor):
+    """Collects (hash, move) pairs of a game's mainline without building a game tree"""
+
+    def __init__(self, max_plies):
+        self.max_plies = max_plies
+
+    def begin_game(self):
+        self.game_result = None
+        self.pairs = []
+        self.tags = {}
+        self.error = None
+
+    def visit_header(self, tagname, tagvalue):
+        if tagname == "Result":
+            self.game_result = RESULTS.get(tagvalue)
+        elif tagname in LABEL_TAGS:
+            self.tags[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        if board.ply() < self.max_plies and self.error is None:
+            self.pairs.append((chess.polyglot.zobrist_hash(board), encode_move(move)))
+
+    def handle_error(self, error):
+        """Skip a game with an illegal or unreadable move (the default re-raises and ends the build)"""
+        if self.error is None:
+            print(f"Skipping {game_label(self.tags)}: {error}", file=sys.stderr)
+        self.error = error
+        self.pairs = []
+
+    def result(self):
+        return (None, []) if self.error else (self.game_result, self.pairs)
+
+def write_run(stats, tmpdir):
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fd, "wb") as f:
+        for (position_hash, move), (white, draws, black) in sorted(stats.items()):
+            f.write(struct.pack(RUN_FORMAT, position_hash, move, white, draws, black))
+    return path
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(RUN_SIZE * 8192)
+            if not chunk:
+                break
+            for fields in struct.iter_unpack(RUN_FORMAT, chunk):
+                yield fields
+
+def find_game_start(f, position):
+    """Offset of the first game starting at or after position"""
+    if position == 0:
+        return 0
+    f.seek(position - 1)
+    carry = b""
+    while True:
+        block = f.read(1 << 16)
+        if not block:
+            return f.seek(0, os.SEEK_END)
+        data = carry + block
+        index = data.find(b"\n[Event ")
+        if index >= 0:
+            return f.tell() - len(data) + index + 1
+        carry = data[-8:]
+
+def open_pgn(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+def index_chunk(task):
+    """Worker: parse one chunk (or a whole compressed file) into sorted run files"""
+    path, start, end, max_plies, tmpdir = task
+    if start is None:
+        handle = open_pgn(path)
+    else:
+        with open(path, "rb") as f:
+            start = find_game_start(f, start)
+            end = find_game_start(f, end)
+            f.seek(start)
+            handle = io.StringIO(f.read(max(0, end - start)).decode("utf-8", "replace"))
+
+    stats = {}
+    runs = []
+    games = 0
+    visitor = PositionVisitor(max_plies)
+    with handle:
+        while True:
+            parsed = chess.pgn.read_game(handle, Visitor=lambda: visitor)
+            if parsed is None:
+                break
+            result, pairs = parsed
+            if result is None:
+                continue  # Unfinished or unknown result
+            games += 1
+            for key in pairs:
+                counts = stats.get(key)
+                if counts is None:
+                    stats[key] = counts = [0, 0, 0]
+                counts[result] += 1
+            if len(stats) >= MAX_RUN_ENTRIES:
+                runs.append(write_run(stats, tmpdir))
+                stats = {}
+    if stats:
+        runs.append(write_run(stats, tmpdir))
+    return runs, games
+
+def plan_tasks(paths, max_plies, tmpdir):
+    tasks = []
+    for path in paths:
+        if path.endswith((".gz", ".bz2")):
+            tasks.append((path, None, None, max_plies, tmpdir))
+            continue
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), CHUNK_SIZE):
+            tasks.append((path, start, min(size, start + CHUNK_SIZE), max_plies, tmpdir))
+    return tasks
+
+def merge_runs(runs, db_path):
+    """Stream-merge sorted runs, summing duplicate (hash, move) pairs, into the final file"""
+    stats_path = db_path + ".stats.tmp"
+    count = 0
+    with open(db_path, "wb") as out, open(stats_path, "wb") as stats_out:
+        out.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0))
+        current = None
+        for position_hash, move, white, draws, black in heapq.merge(*(read_run(run) for run in runs)):
+            if current and current[0] == position_hash and current[1] == move:
+                current[2] += white
+                current[3] += draws
+                current[4] += black
+                continue
+            if current:
+                out.write(struct.pack("<Q", current[0]))
+                stats_out.write(struct.pack(STATS_FORMAT, *current[1:]))
+                count += 1
+            current = [position_hash, move, white, draws, black]
+        if current:
+            out.write(struct.pack("<Q", current[0]))
+            stats_out.write(struct.pack(STATS_FORMAT, *current[1:]))
+            count += 1
+    with open(db_path, "r+b") as out, open(stats_path, "rb") as stats_in:
+        out.seek(0, os.SEEK_END)
+        while True:
+            block = stats_in.read(1 << 20)
+            if not block:
+                break
+            out.write(block)
+        out.seek(0)
+        out.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, count))
+    os.remove(stats_path)
+    return count
+
+def build_index(pgn_paths, db_path, jobs=None, max_plies=MAX_PLIES):
+    """Index PGN archives into db_path; returns (games, entries)"""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_path))) as tmpdir:
+        tasks = plan_tasks(pgn_paths, max_plies, tmpdir)
+        runs = []
+        games = 0
+        with Pool(jobs) as pool:
+            for chunk_runs, chunk_games in pool.imap_unordered(index_chunk, tasks):
+                runs.extend(chunk_runs)
+                games += chunk_games
+        entries = merge_runs(runs, db_path)
+    return games, entries
+
+# === Lookup ===
+def open_opening_db(path):
+    f = open(path, "rb")
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not an opening explorer index (version {VERSION})")
+    view = memoryview(data)
+    return {
+        "file": f,
+        "data": data,
+        "view": view,
+        "count": count,
+        "hashes": view[HEADER_SIZE:HEADER_SIZE + 8 * count].cast("Q"),
+        "stats_offset": HEADER_SIZE + 8 * count,
+    }
+
+def close_opening_db(db):
+    db["hashes"].release()
+    db["view"].release()
+    db["data"].close()
+    db["file"].close()
+
+def lookup_moves(db, board):
+    """(move, white wins, draws, black wins) for every move played from board, most played first"""
+    position_hash = chess.polyglot.zobrist_hash(board)
+    hashes = db["hashes"]
+    low = bisect.bisect_left(hashes, position_hash)
+    high = bisect.bisect_right(hashes, position_hash, low)
+    moves = []
+    for index in range(low, high):
+        move, white, draws, black = struct.unpack_from(STATS_FORMAT, db["data"], db["stats_offset"] + STATS_SIZE * index)
+        moves.append((decode_move(move), white, draws, black))
+    moves.sort(key=lambda entry: entry[1] + entry[2] + entry[3], reverse=True)
+    return moves
+
+# === Command Line ===
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the opening explorer index")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    index_parser = subparsers.add_parser("index", help="index PGN archives")
+    index_parser.add_argument("db")
+    index_parser.add_argument("pgn", nargs="+")
+    index_parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    index_parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    lookup_parser = subparsers.add_parser("lookup", help="show the moves played after a UCI move sequence")
+    lookup_parser.add_argument("db")
+    lookup_parser.add_argument("moves", nargs="*")
+    args = parser.parse_args()
+
+    if args.mode == "index":
+        games, entries = build_index(args.pgn, args.db, args.jobs, args.max_plies)
+        print(f"Indexed {games} games into {entries} position/move entries in {args.db}")
+        return 0
+
+    db = open_opening_db(args.db)
+    board = chess.Board()
+    for uci in args.moves:
+        board.push_uci(uci)
+    for move, white, draws, black in lookup_moves(db, board):
+        total = white + draws + black
+        print(f"{board.san(move):8} {total:8}  +{white} ={draws} -{black}")
+    close_opening_db(db)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""Compact, memory-mapped puzzle database built from a Lichess puzzle CSV.
+
+Import once (streams the CSV, so multi-million-row files are fine):
+    python puzzle_db.py import lichess_db_puzzle.csv puzzles.db
+    python puzzle_db.py pick puzzles.db 1500 [theme]
+
+The file holds fixed-size records sorted by rating, a packed array of the
+ratings for bisecting, a heap of 16-bit moves and, per theme, a sorted list
+of record numbers. At runtime it is memory-mapped, so nothing is loaded up
+front: picking a puzzle is a couple of binary searches over the mapping and
+decoding a single record.
+
+Layout (little-endian):
+    header    MAGIC, version, theme count, record count, section offsets
+    themes    newline-separated theme names
+    ratings   uint16 per record, ascending
+    records   RECORD_FORMAT per record, same order as ratings
+    moves     uint16 per move (from | to << 6 | promotion << 12)
+    theme idx per theme: (offset, count) then uint32 record numbers, ascending
+"""
+import os
+import csv
+import sys
+import gzip
+import bz2
+import mmap
+import time
+import array
+import bisect
+import random
+import struct
+import tempfile
+
+import chess
+
+MAGIC = b"CHPZ"
+VERSION = 1
+HEADER_FORMAT = "<4sHHI5Q"  # magic, version, themes, records, offsets of themes/ratings/records/moves/theme index
+RECORD_FORMAT = "<HbB2QQ16sHI8s"  # rating, popularity, move count, theme bits, occupancy, pieces, flags, moves offset, id
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+MAX_THEMES = 128  # Two 64-bit masks per record
+MAX_RATING = 4095
+PIECE_CODES = {symbol: code for code, symbol in enumerate(" PNBRQK  pnbrqk") if symbol != " "}
+PIECE_SYMBOLS = {code: symbol for symbol, code in PIECE_CODES.items()}
+CASTLING_BITS = {"K": 1, "Q": 2, "k": 4, "q": 8}
+
+# === Encoding ===
+def encode_position(fen):
+    """Pack a FEN into (occupancy bitboard, 16 bytes of piece nibbles, flags)"""
+    placement, turn, castling, ep = fen.split()[:4]
+    occupancy = 0
+    nibbles = []
+    for rank_index, rank in enumerate(placement.split("/")):
+        file_index = 0
+        for char in rank:
+            if char.isdigit():
+                file_index += int(char)
+                continue
+            square = (7 - rank_index) * 8 + file_index
+            occupancy |= 1 << square
+            nibbles.append((square, PIECE_CODES[char]))
+            file_index += 1
+    nibbles.sort()
+    pieces = bytearray(16)
+    for i, (_, code) in enumerate(nibbles):
+        pieces[i // 2] |= code << (4 * (i % 2))
+    flags = (1 if turn == "w" else 0)
+    for char in castling:
+        flags |= CASTLING_BITS.get(char, 0) << 1
+    if ep != "-":
+        flags |= (ord(ep[0]) - ord("a") + 1) << 5
+    return occupancy, bytes(pieces), flags
+
+def decode_position(occupancy, pieces, flags):
+    # Rebuild the piece bitboards directly; much cheaper than set_piece_at per square
+    by_type = [0] * 7
+    by_color = [0, 0]
+    i = 0
+    for square in chess.scan_forward(occupancy):
+        code = (pieces[i >> 1] >> (4 * (i & 1))) & 0xF
+        by_type[code & 7] |= 1 << square
+        by_color[0 if code & 8 else 1] |= 1 << square
+        i += 1
+    board = chess.Board(None)
+    board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings = by_type[1:]
+    board.occupied_co = by_color
+    board.occupied = occupancy
+    board.turn = bool(flags & 1)
+    castling = "".join(char for char, bit in CASTLING_BITS.items() if (flags >> 1) & bit)
+    board.set_castling_fen(castling or "-")
+    ep_file = (flags >> 5) & 0xF
+    if ep_file:
+        board.ep_square = chess.square(ep_file - 1, 5 if board.turn == chess.WHITE else 2)
+    return board
+
+def encode_move(uci):
+    move = chess.Move.from_uci(uci)
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+def decode_move(value):
+    return chess.Move(value & 0x3F, (value >> 6) & 0x3F, (value >> 12) or None)
+
+# === Import ===
+def open_csv(path):
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit("Reading .zst needs the zstandard package (or decompress the file first)")
+        import io
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def import_puzzles(csv_path, db_path):
+    """Stream a Lichess puzzle CSV into db_path; returns the number of puzzles"""
+    theme_ids = {}
+    rating_counts = array.array("I", [0] * (MAX_RATING + 1))
+    theme_counts = []
+    count = 0
+
+    # Pass 1: pack records in CSV order into a temp file, counting ratings/themes
+    unsorted = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(db_path)))
+    moves_file = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(db_path)))
+    moves_written = 0
+    with open_csv(csv_path) as f:
+        for row in csv.DictReader(f):
+            rating = min(MAX_RATING, max(0, int(row["Rating"])))
+            theme_bits = 0
+            for theme in row["Themes"].split():
+                if theme not in theme_ids:
+                    if len(theme_ids) == MAX_THEMES:
+                        continue
+                    theme_ids[theme] = len(theme_ids)
+                    theme_counts.append(0)
+                theme_bits |= 1 << theme_ids[theme]
+                theme_counts[theme_ids[theme]] += 1
+            moves = [encode_move(uci) for uci in row["Moves"].split()]
+            occupancy, pieces, flags = encode_position(row["FEN"])
+            popularity = max(-128, min(127, int(row.get("Popularity") or 0)))
+            unsorted.write(struct.pack(RECORD_FORMAT, rating, popularity, len(moves),
+                                       theme_bits & (2 ** 64 - 1), theme_bits >> 64, occupancy, pieces, flags,
+                                       moves_written, row["PuzzleId"].encode()[:8]))
+            moves_file.write(array.array("H", moves).tobytes())
+            moves_written += len(moves)
+            rating_counts[rating] += 1
+            count += 1
+
+    theme_names = sorted(theme_ids, key=theme_ids.get)
+    themes_blob = "\n".join(theme_names).encode()
+    header_size = struct.calcsize(HEADER_FORMAT)
+    themes_offset = header_size
+    ratings_offset = themes_offset + len(themes_blob)
+    ratings_offset += -ratings_offset % 8
+    records_offset = ratings_offset + 2 * count
+    records_offset += -records_offset % 8
+    moves_offset = records_offset + RECORD_SIZE * count
+    theme_index_offset = moves_offset + 2 * moves_written
+    theme_index_offset += -theme_index_offset % 8
+    theme_data_offset = theme_index_offset + 12 * len(theme_names)
+    total_size = theme_data_offset + 4 * sum(theme_counts)
+
+    with open(db_path, "wb") as out:
+        out.truncate(max(total_size, 1))
+    with open(db_path, "r+b") as out:
+        data = mmap.mmap(out.fileno(), 0)
+        struct.pack_into(HEADER_FORMAT, data, 0, MAGIC, VERSION, len(theme_names), count,
+                         themes_offset, ratings_offset, records_offset, moves_offset, theme_index_offset)
+        data[themes_offset:themes_offset + len(themes_blob)] = themes_blob
+
+        # Pass 2: counting sort by rating, scattering records straight into place
+        slots = array.array("I", [0] * (MAX_RATING + 1))
+        position = 0
+        for rating in range(MAX_RATING + 1):
+            slots[rating] = position
+            position += rating_counts[rating]
+        unsorted.seek(0)
+        while True:
+            chunk = unsorted.read(RECORD_SIZE * 4096)
+            if not chunk:
+                break
+            for start in range(0, len(chunk), RECORD_SIZE):
+                record = chunk[start:start + RECORD_SIZE]
+                rating = struct.unpack_from("<H", record)[0]
+                index = slots[rating]
+                slots[rating] += 1
+                data[records_offset + index * RECORD_SIZE:records_offset + (index + 1) * RECORD_SIZE] = record
+                struct.pack_into("<H", data, ratings_offset + 2 * index, rating)
+
+        moves_file.seek(0)
+        position = moves_offset
+        while True:
+            chunk = moves_file.read(1 << 20)
+            if not chunk:
+                break
+            data[position:position + len(chunk)] = chunk
+            position += len(chunk)
+
+        # Pass 3: per-theme record lists, already ascending because records are sorted
+        cursors = []
+        position = theme_data_offset
+        for theme_id, theme_count in enumerate(theme_counts):
+            struct.pack_into("<QI", data, theme_index_offset + 12 * theme_id, position, theme_count)
+            cursors.append(position)
+            position += 4 * theme_count
+        for index in range(count):
+            low, high = struct.unpack_from("<2Q", data, records_offset + index * RECORD_SIZE + 4)
+            theme_bits = low | high << 64
+            while theme_bits:
+                theme_id = (theme_bits & -theme_bits).bit_length() - 1
+                struct.pack_into("<I", data, cursors[theme_id], index)
+                cursors[theme_id] += 4
+                theme_bits &= theme_bits - 1
+        data.flush()
+        data.close()
+    unsorted.close()
+    moves_file.close()
+    return count
+
+# === Lookup ===
+def open_puzzle_db(path):
+    f = open(path, "rb")
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, theme_count, count, themes_offset, ratings_offset, records_offset, moves_offset, theme_index_offset = \
+        struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a puzzle database (version {VERSION})")
+    themes = data[themes_offset:ratings_offset].rstrip(b"\0").decode().split("\n") if theme_count else []
+    view = memoryview(data)
+    theme_lists = {}
+    for theme_id, theme in enumerate(themes):
+        offset, theme_size = struct.unpack_from("<QI", data, theme_index_offset + 12 * theme_id)
+        theme_lists[theme] = view[offset:offset + 4 * theme_size].cast("I")
+    return {
+        "file": f,
+        "data": data,
+        "view": view,
+        "count": count,
+        "themes": themes,
+        "theme_lists": theme_lists,  # theme -> ascending record numbers
+        "ratings": view[ratings_offset:ratings_offset + 2 * count].cast("H"),
+        "records_offset": records_offset,
+        "moves_offset": moves_offset,
+    }
+
+def close_puzzle_db(db):
+    for theme_list in db["theme_lists"].values():
+        theme_list.release()
+    db["ratings"].release()
+    db["view"].release()
+    db["data"].close()
+    db["file"].close()
+
+def read_puzzle(db, index):
+    rating, popularity, move_count, theme_low, theme_high, occupancy, pieces, flags, moves_at, puzzle_id = \
+        struct.unpack_from(RECORD_FORMAT, db["data"], db["records_offset"] + index * RECORD_SIZE)
+    moves = struct.unpack_from(f"<{move_count}H", db["data"], db["moves_offset"] + 2 * moves_at)
+    theme_bits = theme_low | theme_high << 64
+    return {
+        "id": puzzle_id.rstrip(b"\0").decode(),
+        "rating": rating,
+        "popularity": popularity,
+        "board": decode_position(occupancy, pieces, flags),
+        "moves": [decode_move(value) for value in moves],
+        "themes": [theme for i, theme in enumerate(db["themes"]) if theme_bits >> i & 1],
+    }
+
+def pick_puzzle(db, rating, theme=None, window=100, exclude=()):
+    """Random puzzle rated within +/- window of rating (widening if none), optionally by theme"""
+    ratings = db["ratings"]
+    if db["count"] == 0:
+        return None
+    candidates = db["theme_lists"].get(theme) if theme else None
+    if theme and candidates is None:
+        return None
+    for _ in range(8):
+        low = bisect.bisect_left(ratings, max(0, rating - window))
+        high = bisect.bisect_right(ratings, rating + window)
+        if candidates is not None:
+            low, high = bisect.bisect_left(candidates, low), bisect.bisect_left(candidates, high)
+        if high > low:
+            for _ in range(4):
+                position = random.randrange(low, high)
+                index = candidates[position] if candidates is not None else position
+                puzzle = read_puzzle(db, index)
+                if puzzle["id"] not in exclude:
+                    return puzzle
+        window *= 2
+    return None
+
+# === Command Line ===
+def main():
+    if len(sys.argv) >= 4 and sys.argv[1] == "import":
+        started = time.perf_counter()
+        count = import_puzzles(sys.argv[2], sys.argv[3])
+        print(f"Imported {count} puzzles into {sys.argv[3]} in {time.perf_counter() - started:.1f}s")
+    elif len(sys.argv) >= 4 and sys.argv[1] == "pick":
+        db = open_puzzle_db(sys.argv[2])
+        theme = sys.argv[4] if len(sys.argv) > 4 else None
+        started = time.perf_counter()
+        for _ in range(1000):
+            puzzle = pick_puzzle(db, int(sys.argv[3]), theme)
+        elapsed = (time.perf_counter() - started) / 1000
+        if puzzle is None:
+            print("No matching puzzle")
+        else:
+            print(f"{puzzle['id']} ({puzzle['rating']}) {puzzle['board'].fen()} "
+                  f"{' '.join(move.uci() for move in puzzle['moves'])} [{' '.join(puzzle['themes'])}]")
+        print(f"{elapsed * 1e6:.1f} us per pick")
+        close_puzzle_db(db)
+    else:
+        print(__doc__)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -91,9 +91,23 @@ Engine::Engine(std::optional<std::string> path) :
     options.add(  //
       "Clear Hash", Option([this](const Option&) {
           search_clear();
+          if (!std::string(options["Hash File"]).empty())
+              tt.clear(threads);  // search_clear() keeps a hash loaded from a file
           return std::nullopt;
       }));
 
+    options.add(  //
+      "Hash File", Option("", [this](const Option& o) {
+          if (std::string(o).empty())
+              return std::optional<std::string>();
+          return std::optional<std::string>(load_hash(o));
+      }));
+
+    options.add(  //
+      "Save Hash", Option([this](const Option&) {
+          return std::optional<std::string>(save_hash(options["Hash File"]));
+      }));
+
     options.add(  //
       "Ponder", Option(false));
 
@@ -161,7 +175,9 @@ void Engine::stop() { threads.stop = true; }
 void Engine::search_clear() {
     wait_for_search_finished();
 
-    tt.clear(threads);
+    // With a Hash File the table is meant to persist, so keep it across games
+    if (std::string(options["Hash File"]).empty())
+        tt.clear(threads);
     threads.clear();
 
     // @TODO wont work with multiple instances
@@ -247,6 +263,22 @@ void Engine::set_tt_size(size_t mb) {
     tt.resize(mb, threads);
 }
 
+std::string Engine::load_hash(const std::string& file) {
+    wait_for_search_finished();
+
+    if (tt.load(file))
+        return "Loaded hash from " + file;
+    return "Hash file " + file + " not loaded (missing, or saved with another Hash size)";
+}
+
+std::string Engine::save_hash(const std::string& file) {
+    wait_for_search_finished();
+
+    if (file.empty())
+        return "Set Hash File before saving the hash";
+    return tt.save(file) ? "Saved hash to " + file : "Failed to save hash to " + file;
+}
+
 void Engine::set_ponderhit(bool b) { threads.main_manager()->ponder = b; }
 
 // network related
@@ -74,6 +74,8 @@ class Engine {
     void set_tt_size(size_t mb);
     void set_ponderhit(bool);
     void search_clear();
+    std::string load_hash(const std::string& file);
+    std::string save_hash(const std::string& file);
 
     void set_on_update_no_moves(std::function<void(const InfoShort&)>&&);
     void set_on_update_full(std::function<void(const InfoFull&)>&&);
@@ -21,9 +21,18 @@
 #include <cassert>
 #include <cstdint>
 #include <cstdlib>
+#include <cstdio>
 #include <cstring>
+#include <fstream>
 #include <iostream>
 
+#if !defined(_WIN32)
+    #include <fcntl.h>
+    #include <sys/mman.h>
+    #include <sys/stat.h>
+    #include <unistd.h>
+#endif
+
 #include "memory.h"
 #include "misc.h"
 #include "syzygy/tbprobe.h"
@@ -151,7 +160,7 @@ static_assert(sizeof(Cluster) == 32, "Suboptimal Cluster size");
 // measured in megabytes. Transposition table consists
 // of clusters and each cluster consists of ClusterSize number of TTEntry.
 void TranspositionTable::resize(size_t mbSize, ThreadPool& threads) {
-    aligned_large_pages_free(table);
+    free_table();
 
     clusterCount = mbSize * 1024 * 1024 / sizeof(Cluster);
 
@@ -190,6 +199,114 @@ void TranspositionTable::clear(ThreadPool& threads) {
 }
 
 
+// A hash file is a page-sized header followed by the raw cluster array, so that
+// load() can map the clusters straight from the file. Pages are then only read
+// when a search first touches them, and written-to pages become private copies.
+static constexpr char   HashFileMagic[8]   = {'S', 'F', 'H', 'A', 'S', 'H', '0', '1'};
+static constexpr size_t HashFileHeaderSize = 4096;
+
+struct HashFileHeader {
+    char     magic[8];
+    uint64_t clusterCount;
+    uint8_t  generation8;
+};
+
+static_assert(sizeof(HashFileHeader) <= HashFileHeaderSize);
+
+
+void TranspositionTable::free_table() {
+#if !defined(_WIN32)
+    if (mappedBase)
+    {
+        munmap(mappedBase, mappedSize);
+        mappedBase = nullptr;
+        table      = nullptr;
+        return;
+    }
+#endif
+    aligned_large_pages_free(table);
+    table = nullptr;
+}
+
+
+// Writes the table to a file. It is written to a temporary file and renamed,
+// because the current table may itself be a mapping of that file.
+bool TranspositionTable::save(const std::string& file) const {
+    const std::string tmp = file + ".tmp";
+    std::ofstream     out(tmp, std::ios::binary);
+    if (!out)
+        return false;
+
+    char           header[HashFileHeaderSize] = {};
+    HashFileHeader h{};
+    std::memcpy(h.magic, HashFileMagic, sizeof(h.magic));
+    h.clusterCount = clusterCount;
+    h.generation8  = generation8;
+    std::memcpy(header, &h, sizeof(h));
+
+    out.write(header, sizeof(header));
+    out.write(reinterpret_cast<const char*>(table), clusterCount * sizeof(Cluster));
+    out.close();
+    if (!out)
+    {
+        std::remove(tmp.c_str());
+        return false;
+    }
+
+#if defined(_WIN32)
+    std::remove(file.c_str());  // rename() doesn't replace existing files on Windows
+#endif
+    return std::rename(tmp.c_str(), file.c_str()) == 0;
+}
+
+
+// Replaces the table with one saved by save(). The file must have been saved
+// with the same Hash size; otherwise the current table is left untouched.
+bool TranspositionTable::load(const std::string& file) {
+    std::ifstream  in(file, std::ios::binary);
+    HashFileHeader h{};
+    if (!in.read(reinterpret_cast<char*>(&h), sizeof(h))
+        || std::memcmp(h.magic, HashFileMagic, sizeof(h.magic)) || h.clusterCount != clusterCount)
+        return false;
+
+#if defined(_WIN32)
+    in.seekg(HashFileHeaderSize);
+    if (!in.read(reinterpret_cast<char*>(table), clusterCount * sizeof(Cluster)))
+    {
+        std::memset(table, 0, clusterCount * sizeof(Cluster));
+        return false;
+    }
+#else
+    in.close();
+
+    const size_t size = HashFileHeaderSize + clusterCount * sizeof(Cluster);
+    const int    fd   = open(file.c_str(), O_RDONLY);
+    if (fd == -1)
+        return false;
+
+    struct stat st;
+    if (fstat(fd, &st) == -1 || size_t(st.st_size) != size)
+    {
+        close(fd);
+        return false;
+    }
+
+    void* base = mmap(nullptr, size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (base == MAP_FAILED)
+        return false;
+
+    free_table();
+    mappedBase = base;
+    mappedSize = size;
+    table      = reinterpret_cast<Cluster*>(static_cast<char*>(base) + HashFileHeaderSize);
+#endif
+
+    generation8 = h.generation8;
+    return true;
+}
+
+
 // Returns an approximation of the hashtable
 // occupation during a search. The hash is x permill full, as per UCI protocol.
 // Only counts entries which match the current generation.
@@ -21,6 +21,7 @@
 
 #include <cstddef>
 #include <cstdint>
+#include <string>
 #include <tuple>
 
 #include "memory.h"
@@ -81,10 +82,12 @@ struct TTWriter {
 class TranspositionTable {
 
    public:
-    ~TranspositionTable() { aligned_large_pages_free(table); }
+    ~TranspositionTable() { free_table(); }
 
     void resize(size_t mbSize, ThreadPool& threads);  // Set TT size
     void clear(ThreadPool& threads);                  // Re-initialize memory, multithreaded
+    bool save(const std::string& file) const;         // Dump the table to a file
+    bool load(const std::string& file);  // Map a dumped table back in, if it has the same size
     int  hashfull(int maxAge = 0)
       const;  // Approximate what fraction of entries (permille) have been written to during this root search
 
@@ -99,9 +102,14 @@ class TranspositionTable {
    private:
     friend struct TTEntry;
 
+    void free_table();
+
     size_t   clusterCount;
     Cluster* table = nullptr;
 
+    void*  mappedBase = nullptr;  // Set when the table is a private mapping of a hash file
+    size_t mappedSize = 0;
+
     uint8_t generation8 = 0;  // Size must be not bigger than TTEntry::genBound8
 };
 